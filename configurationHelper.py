@@ -2,6 +2,7 @@
 
 from datetime import datetime
 import argparse
+import secrets
 from getpass import getpass
 import sys
 import logging
@@ -95,6 +96,26 @@ def SetKeys(user: str, password: str, database: str, host: str, key: str, salt:
 
             return None
             
+def AddKeys(user: str, password: str, database: str, host: str, key: str, salt: str) -> int:
+    """
+    """
+    with closing(
+        connect(
+            user=user,
+            password=password,
+            database=database,
+            host=host,
+            auth_plugin="mysql_native_password",
+        )
+    ) as connection:
+        add_keys_query = """INSERT INTO credentials(shared_key, hashing_salt, createdAt) VALUES(%s, %s, %s);"""
+
+        with closing(connection.cursor()) as cursor:
+            cursor.execute(add_keys_query, (key, salt, datetime.now(),))
+            connection.commit()
+
+            return cursor.lastrowid
+
 def GetKeys(user: str, password: str, database: str, host: str) -> None:
     """
     """
@@ -133,6 +154,7 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--setkeys", help="Set shared-key and hashing-salt values", action="store_true")
     parser.add_argument("--getkeys", help="Get shared-key and hashing-salt values", action="store_true")
+    parser.add_argument("--addkeys", help="Add shared-key and hashing-salt values to the keyring", action="store_true")
     args = parser.parse_args()
 
     try:
@@ -191,6 +213,29 @@ def main():
 
             sys.exit(0)
 
+        elif args.addkeys:
+            keyPairs = GetKeys(
+                user=user,
+                password=password,
+                database=database,
+                host=host
+            )
+
+            key = input("Shared Key [default = new random key]:") or secrets.token_hex(nbytes=16)
+            salt = input("Hashing Salt [default = '%s']:" % keyPairs["hashing_salt"]) or keyPairs["hashing_salt"]
+
+            key_id = AddKeys(
+                user=user,
+                password=password,
+                database=database,
+                host=host,
+                salt=salt,
+                key=key
+            )
+
+            print("Added keys %d. Once every server has reloaded, set ACTIVE_KEY=%d (and ACTIVE_SALT=%d if the salt changed)" % (key_id, key_id, key_id))
+            sys.exit(0)
+
         elif args.getkeys:
             keyPairs = GetKeys(
                 user=user,
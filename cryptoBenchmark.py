@@ -0,0 +1,91 @@
+import logging
+import argparse
+import hashlib
+import hmac
+import sys
+import timeit
+
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad
+from Crypto import Random
+
+from src.security.engine import e_key, h_salt, get_engine
+
+def per_call_hash(data: str) -> str:
+    """
+    Hashing as done before the shared engine: the HMAC is keyed from the
+    raw salt on every call.
+    """
+    return hmac.new(h_salt.encode("utf-8"), data.encode("utf-8"), hashlib.sha512).hexdigest()
+
+def per_call_encrypt(data: str) -> str:
+    """
+    Encryption as done before the shared engine: the key is re-encoded and
+    a new random source is opened on every call.
+    """
+    key = e_key.encode("utf8")[:32]
+    iv = Random.new().read(AES.block_size).hex()[:16].encode("utf-8")
+    cipher = AES.new(key, AES.MODE_CBC, iv)
+
+    return iv.decode("utf-8") + cipher.encrypt(pad(data.encode("utf-8"), 16)).hex()
+
+def per_call_sign(data: str) -> str:
+    """
+    Cookie signing as done before the shared engine.
+    """
+    key = e_key.encode("utf8")[:32]
+    signing_key = hashlib.sha256(b"cookie-signing:" + key).digest()
+
+    return hmac.new(signing_key, data.encode("utf-8"), hashlib.sha256).hexdigest()
+
+def engine_encrypt(data: str) -> str:
+    """
+    Encryption with the shared engine, as done by Data.encrypt.
+    """
+    engine = get_engine()
+    iv = engine.random_bytes(AES.block_size).hex()[:16].encode("utf-8")
+    cipher = engine.cipher(AES.MODE_CBC, iv)
+
+    return iv.decode("utf-8") + cipher.encrypt(pad(data.encode("utf-8"), 16)).hex()
+
+def measure(statement, number: int) -> float:
+    """
+    Best of three runs, in microseconds per call.
+    """
+    return min(timeit.repeat(statement, number=number, repeat=3)) / number * 1e6
+
+def main() -> None:
+    """
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", help="Calls per measurement", type=int, default=20000)
+    args = parser.parse_args()
+
+    phone_number = "+237123456789"
+    token = '{"access_token": "xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx", "expires_in": 3599}'
+
+    try:
+        cases = [
+            ("hash", lambda: per_call_hash(phone_number), lambda: get_engine().hash(phone_number.encode("utf-8"))),
+            ("encrypt", lambda: per_call_encrypt(token), lambda: engine_encrypt(token)),
+            ("sign", lambda: per_call_sign(phone_number), lambda: get_engine().sign(phone_number.encode("utf-8"))),
+        ]
+
+        logging.info("%-10s %12s %12s %8s" % ("operation", "before (us)", "after (us)", "speedup"))
+
+        for name, before, after in cases:
+            before_us = measure(before, args.number)
+            after_us = measure(after, args.number)
+
+            logging.info("%-10s %12.2f %12.2f %7.2fx" % (name, before_us, after_us, before_us / after_us))
+
+        sys.exit(0)
+
+    except Exception as error:
+        logging.error(str(error))
+        sys.exit(1)
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level="INFO")
+    main()
@@ -0,0 +1,158 @@
+import logging
+import sys
+from datetime import datetime
+
+from peewee import DatabaseError
+
+from src.schemas.db_connector import db
+from src.schemas.users import Users
+from src.schemas.usersinfo import UsersInfos
+from src.schemas.sessions import Sessions
+from src.schemas.retries import Retries
+from src.schemas.svretries import Svretries
+from src.schemas.wallets import Wallets
+from src.schemas.outbox import Outbox
+
+MODELS = [Users, UsersInfos, Sessions, Retries, Svretries, Wallets, Outbox]
+
+def hot_queries() -> list:
+    """
+    Queries whose plans are reported before and after the migration.
+    """
+    return [
+        ("usersInfos by full_phone_number, status", UsersInfos.select().where(
+            UsersInfos.full_phone_number == "", UsersInfos.status == "verified"
+        )),
+        ("usersInfos by userId, status", UsersInfos.select().where(
+            UsersInfos.userId == "", UsersInfos.status == "verified"
+        )),
+        ("sessions by sid, unique_identifier, user_agent, status, type", Sessions.select().where(
+            Sessions.sid == "", Sessions.unique_identifier == "", Sessions.user_agent == "",
+            Sessions.status == None, Sessions.type == None
+        )),
+        ("sessions by unique_identifier, type", Sessions.select().where(
+            Sessions.unique_identifier == "", Sessions.type == "deleted"
+        )),
+        ("expired sessions", Sessions.select(Sessions.sid).where(
+            Sessions.expires < datetime.now()
+        ).limit(1000)),
+        ("retries by uniqueId", Retries.select().where(Retries.uniqueId == "")),
+        ("svretries by userId, uniqueId", Svretries.select().where(
+            Svretries.userId == "", Svretries.uniqueId == ""
+        )),
+        ("wallets by userId", Wallets.select().where(Wallets.userId == "")),
+    ]
+
+def explain(label: str) -> None:
+    """
+    Log the EXPLAIN plan of every hot query.
+
+    Arguments:
+        label: str
+    """
+    for name, query in hot_queries():
+        sql, params = query.sql()
+        cursor = db.execute_sql("EXPLAIN " + sql, params)
+        columns = [column[0] for column in cursor.description]
+
+        for row in cursor.fetchall():
+            plan = dict(zip(columns, row))
+
+            logging.info(
+                "[%s] %s: type=%s key=%s rows=%s extra=%s" % (
+                    label, name, plan.get("type"), plan.get("key"), plan.get("rows"), plan.get("Extra")
+                )
+            )
+
+def missing_indexes(model) -> list:
+    """
+    Declared indexes of a model that the table does not have yet.
+
+    An existing index whose leading columns match the declared columns
+    counts as present, whatever its name.
+
+    Arguments:
+        model: Model
+
+    Returns:
+        list
+    """
+    table = model._meta.table_name
+    existing = [index.columns for index in db.get_indexes(table)]
+
+    missing = []
+
+    for index in model._meta.fields_to_index():
+        columns = [field.column_name for field in index._expressions]
+
+        if any(found[:len(columns)] == columns for found in existing):
+            continue
+
+        missing.append((index._name, columns, index._unique))
+
+    return missing
+
+def migrate_indexes() -> tuple:
+    """
+    Add every missing declared index using online DDL.
+
+    Returns:
+        tuple (created: int, failed: int)
+    """
+    created = 0
+    failed = 0
+
+    for model in MODELS:
+        table = model._meta.table_name
+
+        if not db.table_exists(table):
+            logging.warning("Table %s does not exist, skipping" % table)
+            continue
+
+        for name, columns, unique in missing_indexes(model):
+            create_index_query = "CREATE %sINDEX `%s` ON `%s` (%s) ALGORITHM=INPLACE LOCK=NONE;" % (
+                "UNIQUE " if unique else "",
+                name,
+                table,
+                ", ".join("`%s`" % column for column in columns)
+            )
+
+            try:
+                logging.debug(create_index_query)
+
+                db.execute_sql(create_index_query)
+
+                created += 1
+                logging.info("- Created index %s on %s (%s)" % (name, table, ", ".join(columns)))
+
+            except DatabaseError as error:
+                failed += 1
+                logging.error("Failed creating index %s on %s: %s" % (name, table, error))
+
+    return created, failed
+
+def main() -> None:
+    """
+    """
+    try:
+        explain(label="before")
+
+        created, failed = migrate_indexes()
+        logging.info("- Successfully created %d indexes" % created)
+
+        explain(label="after")
+
+        if failed:
+            logging.error("Failed creating %d indexes" % failed)
+            sys.exit(1)
+
+        sys.exit(0)
+
+    except Exception as error:
+        logging.error(str(error))
+        sys.exit(1)
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level="INFO")
+    main()
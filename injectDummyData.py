@@ -7,6 +7,7 @@ from peewee import DatabaseError
 from src.schemas.usersinfo import UsersInfos
 from src.schemas.users import Users
 from src.security.data import Data
+from src.security.password import password_hasher
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +26,7 @@ def create(phone_number: str, country_code: str, name: str, password: str) -> No
         userinfos = (
             UsersInfos.select()
             .where(
-                UsersInfos.full_phone_number == phone_number_hash,
+                UsersInfos.full_phone_number.in_(data.hashes(full_phone_number)),
                 UsersInfos.status == "verified"
             )
             .dicts()
@@ -45,7 +46,7 @@ def create(phone_number: str, country_code: str, name: str, password: str) -> No
             logger.info("creating user '%s' ..." % phone_number_hash)
 
             data = Data()
-            password_hash = data.hash(password)
+            password_hash = password_hasher.hash(password)
 
             new_user = Users.create(
                 password = password_hash
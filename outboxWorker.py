@@ -0,0 +1,55 @@
+import logging
+import argparse
+import sys
+import time
+
+from settings import Configurations
+interval = Configurations.OUTBOX_INTERVAL
+batch_size = Configurations.OUTBOX_BATCH_SIZE
+max_attempts = Configurations.OUTBOX_MAX_ATTEMPTS
+backoff = Configurations.OUTBOX_BACKOFF
+max_backoff = Configurations.OUTBOX_MAX_BACKOFF
+
+from src.outbox import drain
+from src.models.grants import outbox, outbox_handlers
+
+def main() -> None:
+    """
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--once", help="Drain the due jobs once and exit", action="store_true")
+    parser.add_argument("--interval", help="Seconds to sleep between two drains", type=float, default=interval)
+    parser.add_argument("--batch-size", help="Number of jobs claimed at once", type=int, default=batch_size)
+    args = parser.parse_args()
+
+    handlers = outbox_handlers()
+
+    try:
+        while True:
+            drain(
+                store=outbox,
+                handlers=handlers,
+                batch_size=args.batch_size,
+                max_attempts=max_attempts,
+                backoff=backoff,
+                max_backoff=max_backoff
+            )
+
+            if args.once:
+                break
+
+            time.sleep(args.interval)
+
+        sys.exit(0)
+
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+    except Exception as error:
+        logging.error(str(error))
+        sys.exit(1)
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level="INFO")
+    main()
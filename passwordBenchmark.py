@@ -0,0 +1,80 @@
+import logging
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.security.password import PasswordHasher
+
+def run_logins(hasher: PasswordHasher, password_hash: str, logins: int, clients: int) -> tuple:
+    """
+    Verify a password logins times from clients concurrent request
+    threads.
+
+    Returns:
+        tuple (logins per second, median latency in ms, 99th percentile
+        latency in ms)
+    """
+    def login(_) -> float:
+        started = time.perf_counter()
+        match, _ = hasher.verify(password="benchmark-password", password_hash=password_hash)
+
+        if not match:
+            raise ValueError("Password mismatch")
+
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        latencies = sorted(executor.map(login, range(logins)))
+
+    elapsed = time.perf_counter() - started
+
+    return (
+        logins / elapsed,
+        latencies[len(latencies) // 2] * 1000,
+        latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000
+    )
+
+def main() -> None:
+    """
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--costs", help="Comma separated scrypt n values", default="4096,8192,16384,32768")
+    parser.add_argument("--logins", help="Logins per cost", type=int, default=200)
+    parser.add_argument("--clients", help="Concurrent request threads", type=int, default=32)
+    parser.add_argument("--workers", help="Password hashing threads", type=int, default=4)
+    args = parser.parse_args()
+
+    # the legacy hash logs every call
+    logging.getLogger("src").setLevel(logging.WARNING)
+
+    try:
+        cases = [("hmac", PasswordHasher(kdf="hmac", workers=args.workers, queue_size=args.clients))]
+
+        for n in args.costs.split(","):
+            cases.append((
+                "scrypt n=%s" % n,
+                PasswordHasher(kdf="scrypt", n=int(n), workers=args.workers, queue_size=args.clients)
+            ))
+
+        logging.info("%-14s %12s %10s %10s" % ("kdf", "logins/s", "p50 (ms)", "p99 (ms)"))
+
+        for name, hasher in cases:
+            password_hash = hasher.hash("benchmark-password")
+            rate, p50, p99 = run_logins(hasher, password_hash, args.logins, args.clients)
+            hasher.stop()
+
+            logging.info("%-14s %12.1f %10.2f %10.2f" % (name, rate, p50, p99))
+
+        sys.exit(0)
+
+    except Exception as error:
+        logging.error(str(error))
+        sys.exit(1)
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level="INFO")
+    main()
@@ -0,0 +1,59 @@
+import logging
+import argparse
+import sys
+
+from settings import Configurations
+data_format = Configurations.DATA_FORMAT.lower()
+
+from src.reencrypt import reencrypt
+
+def main() -> None:
+    """
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source-key", help="File holding the key the data is currently encrypted with, when rotating keys")
+    parser.add_argument("--checkpoint", help="File recording the progress, to resume an interrupted run", default="reencrypt.checkpoint")
+    parser.add_argument("--chunk-size", help="Number of rows read and written at once", type=int, default=500)
+    parser.add_argument("--workers", help="Number of threads encrypting a chunk", type=int, default=4)
+    parser.add_argument("--reset", help="Ignore the checkpoint and start over", action="store_true")
+    args = parser.parse_args()
+
+    if data_format != "v2":
+        logging.error("Re-encryption requires DATA_FORMAT=v2")
+        sys.exit(1)
+
+    try:
+        source_key = None
+
+        if args.source_key:
+            source_key = open(args.source_key, "r", encoding="utf-8").readline().strip()
+
+        results = reencrypt(
+            source_key=source_key,
+            checkpoint_path=args.checkpoint,
+            chunk_size=args.chunk_size,
+            workers=args.workers,
+            reset=args.reset
+        )
+
+        for table, result in results.items():
+            logging.info(
+                "- Successfully re-encrypted %s: %d rows scanned, %d updated, %d failed in %.1fs" % (
+                    table, result["scanned"], result["updated"], result["failed"], result["seconds"]
+                )
+            )
+
+        if any(result["failed"] for result in results.values()):
+            logging.error("Some rows could not be decrypted and were skipped, check logs")
+            sys.exit(1)
+
+        sys.exit(0)
+
+    except Exception as error:
+        logging.error(str(error))
+        sys.exit(1)
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level="INFO")
+    main()
@@ -0,0 +1,218 @@
+import logging
+import argparse
+import sys
+
+from playhouse.migrate import SchemaMigrator, migrate
+
+from configurationHelper import DatabaseExists, CreateDatabase
+
+from settings import Configurations
+db_name = Configurations.MYSQL_DATABASE
+db_host = Configurations.MYSQL_HOST
+db_password = Configurations.MYSQL_PASSWORD
+db_user = Configurations.MYSQL_USER
+
+from src.schemas.db_connector import db
+from src.schemas.credentials import Credentials
+from src.schemas.users import Users
+from src.schemas.usersinfo import UsersInfos
+from src.schemas.sessions import Sessions
+from src.schemas.retries import Retries
+from src.schemas.svretries import Svretries
+from src.schemas.wallets import Wallets
+from src.schemas.outbox import Outbox
+
+MODELS = [Credentials, Users, UsersInfos, Sessions, Retries, Svretries, Wallets, Outbox]
+
+def create_database_if_not_exits(user: str, password: str, database: str, host: str) -> None:
+    """
+    """
+    try:
+        if DatabaseExists(user=user, password=password, database=database, host=host):
+            pass
+        else:
+            CreateDatabase(
+                user=user,
+                password=password,
+                database=database,
+                host=host
+            )
+
+    except Exception as error:
+        raise error
+
+def missing_tables() -> list:
+    """
+    Models whose table does not exist.
+
+    Returns:
+        list
+    """
+    return [model for model in MODELS if not db.table_exists(model._meta.table_name)]
+
+def missing_columns() -> list:
+    """
+    Declared columns missing from existing tables.
+
+    Returns:
+        list
+    """
+    missing = []
+
+    for model in MODELS:
+        table = model._meta.table_name
+
+        if not db.table_exists(table):
+            continue
+
+        columns = [column.name for column in db.get_columns(table)]
+
+        for field in model._meta.sorted_fields:
+            if field.column_name not in columns:
+                missing.append("%s.%s" % (table, field.column_name))
+
+    return missing
+
+def add_missing_columns() -> int:
+    """
+    Add declared columns missing from existing tables.
+
+    Returns:
+        int
+    """
+    migrator = SchemaMigrator.from_database(db)
+    added = 0
+
+    for model in MODELS:
+        table = model._meta.table_name
+
+        if not db.table_exists(table):
+            continue
+
+        columns = [column.name for column in db.get_columns(table)]
+
+        for field in model._meta.sorted_fields:
+            if field.column_name in columns:
+                continue
+
+            logging.debug("Adding column %s.%s ..." % (table, field.column_name))
+
+            migrate(migrator.add_column(table, field.column_name, field))
+
+            added += 1
+            logging.info("- Successfully added column %s.%s" % (table, field.column_name))
+
+    return added
+
+def backfill_verified_phone_numbers() -> int:
+    """
+    Copy the phone number of verified accounts into the unique
+    verified_phone_number column.
+
+    Returns:
+        int
+    """
+    rows = (
+        UsersInfos.update(verified_phone_number=UsersInfos.full_phone_number)
+        .where(
+            UsersInfos.status == "verified",
+            UsersInfos.verified_phone_number.is_null()
+        )
+        .execute()
+    )
+
+    if rows:
+        logging.info("- Successfully backfilled %d verified phone numbers" % rows)
+
+    return rows
+
+def bootstrap() -> None:
+    """
+    Create the database, the tables, the columns and the initial credentials
+    if missing.
+    """
+    create_database_if_not_exits(
+        database=db_name,
+        host=db_host,
+        password=db_password,
+        user=db_user
+    )
+
+    tables = missing_tables()
+
+    if tables:
+        logging.debug("Creating tables %s ..." % ", ".join(model._meta.table_name for model in tables))
+
+        db.create_tables(tables, safe=True)
+
+        logging.info("- Successfully created %d tables" % len(tables))
+
+    add_missing_columns()
+    backfill_verified_phone_numbers()
+
+    try:
+        Credentials.get(Credentials.id == 1)
+    except Credentials.DoesNotExist:
+        logging.debug("Adding initials credentials ...")
+
+        Credentials.create()
+
+        logging.info("- Successfully added initial credentials")
+
+def verify() -> bool:
+    """
+    Check that the database, every table, column and the credentials exist.
+
+    Returns:
+        bool
+    """
+    if not DatabaseExists(user=db_user, password=db_password, database=db_name, host=db_host):
+        logging.error("Unknown database '%s'" % db_name)
+        return False
+
+    tables = missing_tables()
+
+    for model in tables:
+        logging.error("Missing table '%s'" % model._meta.table_name)
+
+    columns = missing_columns()
+
+    for column in columns:
+        logging.error("Missing column '%s'" % column)
+
+    credentials = Credentials not in tables and Credentials.get_or_none(Credentials.id == 1)
+
+    if not credentials:
+        logging.error("Missing credentials")
+
+    return not tables and not columns and bool(credentials)
+
+def main() -> None:
+    """
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--verify", help="Only verify the schema, without creating anything", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        if not args.verify:
+            bootstrap()
+
+        if verify():
+            logging.info("- Schema verified")
+            sys.exit(0)
+        else:
+            sys.exit(1)
+
+    except Exception as error:
+        logging.error(str(error))
+        sys.exit(1)
+
+    finally:
+        if not db.is_closed():
+            db.close()
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level="INFO")
+    main()
@@ -14,12 +14,25 @@ ssl_pem = Configurations.SSL_PEM
 api_host = Configurations.HOST
 api_port = Configurations.PORT
 api_origins = Configurations.ORIGINS
+enable_session_reaper = Configurations.ENABLE_SESSION_REAPER
+session_reaper_interval = Configurations.SESSION_REAPER_INTERVAL
+session_reaper_chunk_size = Configurations.SESSION_REAPER_CHUNK_SIZE
+session_reaper_pause = Configurations.SESSION_REAPER_PAUSE
+enable_outbox_worker = Configurations.ENABLE_OUTBOX_WORKER
+outbox_interval = Configurations.OUTBOX_INTERVAL
+outbox_batch_size = Configurations.OUTBOX_BATCH_SIZE
+outbox_max_attempts = Configurations.OUTBOX_MAX_ATTEMPTS
+outbox_backoff = Configurations.OUTBOX_BACKOFF
+outbox_max_backoff = Configurations.OUTBOX_MAX_BACKOFF
 
 from flask import Flask
 from flask import send_from_directory
 from flask_cors import CORS
 
 from src.api_v2 import v2
+from src.reaper import SessionReaper
+from src.outbox import OutboxWorker
+from src.models.grants import outbox, outbox_handlers
 
 from SwobThirdPartyPlatforms import base_dir
 
@@ -39,6 +52,24 @@ def send_report(path):
     logo_path = os.path.join(base_dir, platform_name)
     return send_from_directory(logo_path, path)
 
+if enable_session_reaper:
+    SessionReaper(
+        interval=session_reaper_interval,
+        chunk_size=session_reaper_chunk_size,
+        pause=session_reaper_pause
+    ).start()
+
+if enable_outbox_worker:
+    OutboxWorker(
+        store=outbox,
+        handlers=outbox_handlers(),
+        interval=outbox_interval,
+        batch_size=outbox_batch_size,
+        max_attempts=outbox_max_attempts,
+        backoff=outbox_backoff,
+        max_backoff=outbox_max_backoff
+    ).start()
+
 checkSSL = isSSL(path_crt_file=ssl_cert, path_key_file=ssl_key, path_pem_file=ssl_pem)
 
 if __name__ == "__main__":
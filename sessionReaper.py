@@ -0,0 +1,33 @@
+import logging
+import argparse
+import sys
+
+from settings import Configurations
+chunk_size = Configurations.SESSION_REAPER_CHUNK_SIZE
+pause = Configurations.SESSION_REAPER_PAUSE
+
+from src.reaper import reap_sessions
+
+def main() -> None:
+    """
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunk-size", help="Number of sessions deleted per batch", type=int, default=chunk_size)
+    parser.add_argument("--pause", help="Seconds to sleep between batches", type=float, default=pause)
+    args = parser.parse_args()
+
+    try:
+        result = reap_sessions(chunk_size=args.chunk_size, pause=args.pause)
+
+        logging.info("- Removed %d expired sessions in %.3fs" % (result["removed"], result["seconds"]))
+
+        sys.exit(0)
+
+    except Exception as error:
+        logging.error(str(error))
+        sys.exit(1)
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level="INFO")
+    main()
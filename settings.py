@@ -29,13 +29,66 @@ class Configurations(baseConfig):
     MYSQL_USER = os.environ.get("MYSQL_USER")
     MYSQL_PASSWORD = os.environ.get("MYSQL_PASSWORD")
     MYSQL_DATABASE = os.environ.get("MYSQL_DATABASE")
+
+    MYSQL_POOL = (os.environ.get("MYSQL_POOL") or "False").lower() == "true"
+    MYSQL_POOL_MAX_CONNECTIONS = int(os.environ.get("MYSQL_POOL_MAX_CONNECTIONS") or 20)
+    MYSQL_POOL_STALE_TIMEOUT = int(os.environ.get("MYSQL_POOL_STALE_TIMEOUT") or 3600) #s 1hr
+    MYSQL_POOL_IDLE_TIMEOUT = int(os.environ.get("MYSQL_POOL_IDLE_TIMEOUT") or 300) #s 5mins
+    MYSQL_POOL_TIMEOUT = int(os.environ.get("MYSQL_POOL_TIMEOUT") or 10) #s
+    MYSQL_POOL_PRE_PING = (os.environ.get("MYSQL_POOL_PRE_PING") or "True").lower() == "true"
     
     SHARED_KEY = os.environ.get("SHARED_KEY")
     HASHING_SALT = os.environ.get("HASHING_SALT")
+    ACTIVE_KEY = os.environ.get("ACTIVE_KEY")
+    ACTIVE_SALT = os.environ.get("ACTIVE_SALT")
 
     COOKIE_NAME = "SWOB"
+    COOKIE_FORMAT = os.environ.get("COOKIE_FORMAT") or "binary"
+    DATA_FORMAT = os.environ.get("DATA_FORMAT") or "v2"
+    PASSWORD_KDF = os.environ.get("PASSWORD_KDF") or "scrypt"
+    SCRYPT_N = int(os.environ.get("SCRYPT_N") or 16384)
+    SCRYPT_R = int(os.environ.get("SCRYPT_R") or 8)
+    SCRYPT_P = int(os.environ.get("SCRYPT_P") or 1)
+    PASSWORD_WORKERS = int(os.environ.get("PASSWORD_WORKERS") or 4)
+    PASSWORD_QUEUE_SIZE = int(os.environ.get("PASSWORD_QUEUE_SIZE") or 64)
     COOKIE_MAXAGE = os.environ.get("COOKIE_MAXAGE") or 900000 #ms 15mins
     SESSION_MAXAGE = os.environ.get("SESSION_MAXAGE") or 2700000 #ms 45mins
+    SESSION_REFRESH_THRESHOLD = float(os.environ.get("SESSION_REFRESH_THRESHOLD") or 0.25) #fraction of COOKIE_MAXAGE
+
+    SESSION_STORE = os.environ.get("SESSION_STORE") or "mysql"
+    SESSION_STORE_URL = os.environ.get("SESSION_STORE_URL") or "redis://localhost:6379/0"
+
+    ENABLE_STATELESS_SESSIONS = (os.environ.get("ENABLE_STATELESS_SESSIONS") or "False").lower() == "true"
+    SESSION_VERSION = int(os.environ.get("SESSION_VERSION") or 1)
+    REVOCATION_LIST_SIZE = int(os.environ.get("REVOCATION_LIST_SIZE") or 10000)
+
+    ENABLE_SESSION_CACHE = (os.environ.get("ENABLE_SESSION_CACHE") or "False").lower() == "true"
+    SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE") or 10000)
+    SESSION_CACHE_TTL = int(os.environ.get("SESSION_CACHE_TTL") or 60) #s
+
+    ENABLE_SESSION_REAPER = (os.environ.get("ENABLE_SESSION_REAPER") or "False").lower() == "true"
+    SESSION_REAPER_INTERVAL = int(os.environ.get("SESSION_REAPER_INTERVAL") or 3600) #s 1hr
+    SESSION_REAPER_CHUNK_SIZE = int(os.environ.get("SESSION_REAPER_CHUNK_SIZE") or 1000)
+    SESSION_REAPER_PAUSE = float(os.environ.get("SESSION_REAPER_PAUSE") or 0.5) #s
+
+    ENABLE_LOGIN_BUFFER = (os.environ.get("ENABLE_LOGIN_BUFFER") or "False").lower() == "true"
+    LOGIN_BUFFER_INTERVAL = int(os.environ.get("LOGIN_BUFFER_INTERVAL") or 500) #ms
+    LOGIN_BUFFER_SIZE = int(os.environ.get("LOGIN_BUFFER_SIZE") or 100)
+
+    REVOCATION_WORKERS = int(os.environ.get("REVOCATION_WORKERS") or 16)
+    REVOCATION_TIMEOUT = float(os.environ.get("REVOCATION_TIMEOUT") or 10) #s
+    REVOCATION_TIMEOUTS = os.environ.get("REVOCATION_TIMEOUTS") or "{}" #s per platform
+
+    TWOFACTOR_TIMEOUT = float(os.environ.get("TWOFACTOR_TIMEOUT") or 30) #s
+
+    ENABLE_REVOCATION_OUTBOX = (os.environ.get("ENABLE_REVOCATION_OUTBOX") or "False").lower() == "true"
+    OUTBOX_BACKEND = os.environ.get("OUTBOX_BACKEND") or "mysql"
+    ENABLE_OUTBOX_WORKER = (os.environ.get("ENABLE_OUTBOX_WORKER") or "False").lower() == "true"
+    OUTBOX_INTERVAL = float(os.environ.get("OUTBOX_INTERVAL") or 5) #s
+    OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE") or 50)
+    OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS") or 8)
+    OUTBOX_BACKOFF = float(os.environ.get("OUTBOX_BACKOFF") or 2) #s
+    OUTBOX_MAX_BACKOFF = float(os.environ.get("OUTBOX_MAX_BACKOFF") or 3600) #s
 
     ENABLE_BLOCKING = True
     SHORT_BLOCK_ATTEMPTS = 5
@@ -11,12 +11,14 @@ from flask import Blueprint
 from flask import request
 from flask import Response
 from flask import jsonify
+from flask import g
 
 from src.protocolHandler import OAuth2, TwoFactor
 
 from src.security.cookie import Cookie
 from src.security.data import Data
 from src.security.password_policy import password_check
+from src.security.password import password_hasher
 
 import json
 from datetime import datetime
@@ -28,6 +30,11 @@ from src.models.sessions import Session_Model
 from src.models._2FA import OTP_Model
 
 from src.schemas.db_connector import db
+from src.schemas.db_connector import track_request, request_stats
+
+from src.platforms import catalog_version
+
+from hashlib import sha256
 
 v2 = Blueprint("v2", __name__)
 
@@ -39,14 +46,39 @@ from werkzeug.exceptions import InternalServerError
 from werkzeug.exceptions import TooManyRequests
 from werkzeug.exceptions import UnprocessableEntity
 
-@v2.before_request
-def before_request():
-    db.connect()
+def release_connection() -> None:
+    """
+    Close the current thread's database connection, if the request opened one.
+    """
+    if not db.is_closed():
+        g.db_touched = True
+        db.close()
+
+def make_etag(*parts: str) -> str:
+    """
+    Strong entity tag of a representation built from parts.
+
+    Arguments:
+        parts: str
+
+    Returns:
+        str
+    """
+    return sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+@v2.teardown_request
+def teardown_request(exception):
+    release_connection()
+
+    touched = g.pop("db_touched", False)
+    track_request(touched=touched)
+
+    if not touched:
+        stats = request_stats()
+        logger.debug("- Request finished without a database connection (%d/%d)" % (stats["untouched"], stats["requests"]))
 
 @v2.after_request
 def after_request(response):
-    db.close()
-    
     response.headers["Strict-Transport-Security"] = "max-age=63072000; includeSubdomains"
     response.headers["X-Content-Type-Options"] = "nosniff"
     response.headers["Content-Security-Policy"] = "script-src 'self'; object-src 'self'"
@@ -88,11 +120,14 @@ def signup():
 
             password_check(password=password)
 
+            phone_number_hash = data.hash(country_code+phone_number)
+
             user_id = User.create(
                 phone_number=phone_number,
                 name=name,
                 country_code=country_code,
-                password=password
+                password=password,
+                phone_number_hash=phone_number_hash
             )
 
             res = jsonify({
@@ -100,17 +135,17 @@ def signup():
             })
 
             session = Session.create(
-                unique_identifier=data.hash(country_code+phone_number),
+                unique_identifier=phone_number_hash,
                 user_agent=user_agent,
                 type="signup",
             )
 
-            cookie_data = json.dumps({
+            cookie_data = {
                 "sid": session["sid"],
                 "cookie": session["data"],
                 "type":session["type"]
-            })
-            e_cookie = cookie.encrypt(cookie_data)
+            }
+            e_cookie = cookie.dumps(cookie_data)
 
             session_data = json.loads(session["data"])
 
@@ -132,8 +167,7 @@ def signup():
                 raise BadRequest()
 
             e_cookie = request.cookies.get(cookie_name)
-            d_cookie = cookie.decrypt(e_cookie)
-            json_cookie = json.loads(d_cookie)
+            json_cookie = cookie.loads(e_cookie)
 
             sid = json_cookie["sid"]
             uid = json_cookie["uid"]
@@ -171,6 +205,9 @@ def signup():
     except BadRequest as err:
         return str(err), 400
 
+    except TooManyRequests as err:
+        return str(err), 429
+
     except Unauthorized as err:
         return str(err), 401
 
@@ -215,12 +252,12 @@ def recovery():
             type="recovery",
         )
 
-        cookie_data = json.dumps({
+        cookie_data = {
             "sid": session["sid"],
             "cookie": session["data"],
             "type":session["type"]
-        })
-        e_cookie = cookie.encrypt(cookie_data)
+        }
+        e_cookie = cookie.dumps(cookie_data)
 
         session_data = json.loads(session["data"])
 
@@ -273,8 +310,7 @@ async def recovery_check(user_id):
             raise BadRequest()
 
         e_cookie = request.cookies.get(cookie_name)
-        d_cookie = cookie.decrypt(e_cookie)
-        json_cookie = json.loads(d_cookie)
+        json_cookie = cookie.loads(e_cookie)
 
         sid = json_cookie["sid"]
         unique_identifier = json_cookie["unique_identifier"]
@@ -294,24 +330,15 @@ async def recovery_check(user_id):
             status=status
         )
 
-        wallets = Grant.find_all(user_id=user_id)
-
-        for wallet in wallets:
-            grant = Grant.find(user_id=user_id, platform_id=wallet["platformId"])
-            d_grant = Grant.decrypt(grant=grant)
-
-            Grant.purge(
-                originUrl=originUrl,
-                identifier="",
-                platform_name=wallet["platformId"],
-                token=d_grant["token"]
-            )
-
-            Grant.delete(grant=grant)
+        Grant.purge_all(
+            originUrl=originUrl,
+            identifier="",
+            user_id=user_id
+        )
 
         User.update(
             user_id=user_id,
-            password=data.hash(new_password)
+            password=password_hasher.hash(new_password)
         )
 
         Session.update(
@@ -328,6 +355,9 @@ async def recovery_check(user_id):
     except BadRequest as err:
         return str(err), 400
 
+    except TooManyRequests as err:
+        return str(err), 429
+
     except Unauthorized as err:
         return str(err), 401
 
@@ -342,6 +372,9 @@ async def recovery_check(user_id):
         logger.exception(err)
         return "internal server error", 500
 
+    finally:
+        release_connection()
+
 @v2.route("/login", methods=["POST"])
 def signin():
     """
@@ -390,12 +423,18 @@ def signin():
             user_agent=user_agent
         )
 
-        cookie_data = json.dumps({
+        cookie_data = {
             "sid": session["sid"],
-            "cookie": session["data"]
-        })
+            "cookie": session["data"],
+            **Session.claims(
+                sid=session["sid"],
+                unique_identifier=user["userId"],
+                user_agent=user_agent,
+                data=session["data"]
+            )
+        }
 
-        e_cookie = cookie.encrypt(cookie_data)
+        e_cookie = cookie.dumps(cookie_data)
 
         session_data = json.loads(session["data"])
 
@@ -450,8 +489,7 @@ def OTP(user_id):
         cookie = Cookie()
 
         e_cookie = request.cookies.get(cookie_name)
-        d_cookie = cookie.decrypt(e_cookie)
-        json_cookie = json.loads(d_cookie)
+        json_cookie = cookie.loads(e_cookie)
 
         sid = json_cookie["sid"]
         user_cookie = json_cookie["cookie"]
@@ -502,16 +540,16 @@ def OTP(user_id):
             type=type
         )
 
-        cookie_data = json.dumps({
+        cookie_data = {
             "sid": session["sid"],
             "uid": user_id,
             "cookie": session["data"],
             "type": session["type"],
             "phone_number": phone_number,
             "cid": cid
-        })
+        }
 
-        e_cookie = cookie.encrypt(cookie_data)
+        e_cookie = cookie.dumps(cookie_data)
 
         session_data = json.loads(session["data"])
 
@@ -566,8 +604,7 @@ def OTP_check():
         cookie = Cookie()
 
         e_cookie = request.cookies.get(cookie_name)
-        d_cookie = cookie.decrypt(e_cookie)
-        json_cookie = json.loads(d_cookie)
+        json_cookie = cookie.loads(e_cookie)
 
         sid = json_cookie["sid"]
         uid = json_cookie["uid"]
@@ -612,16 +649,16 @@ def OTP_check():
             type=type
         )
 
-        cookie_data = json.dumps({
+        cookie_data = {
             "sid": session["sid"],
             "unique_identifier": session["uid"],
             "uid": uid,
             "cookie": session["data"],
             "status": "success",
             "type": type
-        })
+        }
 
-        e_cookie = cookie.encrypt(cookie_data)
+        e_cookie = cookie.dumps(cookie_data)
 
         session_data = json.loads(session["data"])
 
@@ -677,8 +714,7 @@ def manage_grant(user_id, platform, protocol, action) -> dict:
         cookie = Cookie()
 
         e_cookie = request.cookies.get(cookie_name)
-        d_cookie = cookie.decrypt(e_cookie)
-        json_cookie = json.loads(d_cookie)
+        json_cookie = cookie.loads(e_cookie)
 
         sid = json_cookie["sid"]
         user_cookie = json_cookie["cookie"]
@@ -772,26 +808,34 @@ def manage_grant(user_id, platform, protocol, action) -> dict:
 
         session = Session.update(
             sid=sid,
-            unique_identifier=user_id
+            unique_identifier=user_id,
+            cookie=user_cookie
         )
 
-        cookie_data = json.dumps({
-            "sid": session["sid"],
-            "cookie": session["data"]
-        })
+        if session["refreshed"]:
+            cookie_data = {
+                "sid": session["sid"],
+                "cookie": session["data"],
+                **Session.claims(
+                    sid=session["sid"],
+                    unique_identifier=user_id,
+                    user_agent=user_agent,
+                    data=session["data"]
+                )
+            }
 
-        e_cookie = cookie.encrypt(cookie_data)
+            e_cookie = cookie.dumps(cookie_data)
 
-        session_data = json.loads(session["data"])
+            session_data = json.loads(session["data"])
 
-        res.set_cookie(
-            cookie_name,
-            e_cookie,
-            max_age=timedelta(milliseconds=session_data["maxAge"]),
-            secure=session_data["secure"],
-            httponly=session_data["httpOnly"],
-            samesite=session_data["sameSite"]
-        )
+            res.set_cookie(
+                cookie_name,
+                e_cookie,
+                max_age=timedelta(milliseconds=session_data["maxAge"]),
+                secure=session_data["secure"],
+                httponly=session_data["httpOnly"],
+                samesite=session_data["sameSite"]
+            )
 
         return res, 200
 
@@ -838,48 +882,71 @@ def get_platforms(user_id):
         cookie = Cookie()
 
         e_cookie = request.cookies.get(cookie_name)
-        d_cookie = cookie.decrypt(e_cookie)
-        json_cookie = json.loads(d_cookie)
+        json_cookie = cookie.loads(e_cookie)
 
         sid = json_cookie["sid"]
         user_cookie = json_cookie["cookie"]
         user_agent = request.headers.get("User-Agent")
     
-        Session.find(
+        if not Session.authorize(
             sid=sid,
             unique_identifier=user_id,
             user_agent=user_agent,
-            cookie=user_cookie
-        )
+            claims=json_cookie
+        ):
+            Session.find(
+                sid=sid,
+                unique_identifier=user_id,
+                user_agent=user_agent,
+                cookie=user_cookie
+            )
 
-        user_platforms = User.find_platform(user_id=user_id)
+        saved_platforms = User.find_saved_platforms(user_id=user_id)
 
-        res = jsonify(user_platforms)
+        # saved platforms are listed in the order they come back, so the tag follows it
+        etag = make_etag("platforms", user_id, catalog_version, *saved_platforms)
+
+        if request.if_none_match.contains_weak(etag):
+            res = Response(status=304)
+        else:
+            user_platforms = User.find_platform(user_id=user_id, saved_platforms=saved_platforms)
+
+            res = jsonify(user_platforms)
+
+        res.set_etag(etag)
 
         session = Session.update(
             sid=sid,
-            unique_identifier=user_id
+            unique_identifier=user_id,
+            cookie=user_cookie
         )
 
-        cookie_data = json.dumps({
-            "sid": session["sid"],
-            "cookie": session["data"]
-        })
+        if session["refreshed"]:
+            cookie_data = {
+                "sid": session["sid"],
+                "cookie": session["data"],
+                **Session.claims(
+                    sid=session["sid"],
+                    unique_identifier=user_id,
+                    user_agent=user_agent,
+                    data=session["data"]
+                )
+            }
 
-        e_cookie = cookie.encrypt(cookie_data)
+            e_cookie = cookie.dumps(cookie_data)
 
-        session_data = json.loads(session["data"])
+            session_data = json.loads(session["data"])
 
-        res.set_cookie(
-            cookie_name,
-            e_cookie,
-            max_age=timedelta(milliseconds=session_data["maxAge"]),
-            secure=session_data["secure"],
-            httponly=session_data["httpOnly"],
-            samesite=session_data["sameSite"]
-        )
+            res.set_cookie(
+                cookie_name,
+                e_cookie,
+                max_age=timedelta(milliseconds=session_data["maxAge"]),
+                secure=session_data["secure"],
+                httponly=session_data["httpOnly"],
+                samesite=session_data["sameSite"]
+            )
 
-        return res, 200
+        return res, res.status_code
                 
     except BadRequest as err:
         return str(err), 400
@@ -918,19 +985,24 @@ def dashboard(user_id):
         cookie = Cookie()
 
         e_cookie = request.cookies.get(cookie_name)
-        d_cookie = cookie.decrypt(e_cookie)
-        json_cookie = json.loads(d_cookie)
+        json_cookie = cookie.loads(e_cookie)
 
         sid = json_cookie["sid"]
         user_cookie = json_cookie["cookie"]
         user_agent = request.headers.get("User-Agent")
     
-        Session.find(
+        if not Session.authorize(
             sid=sid,
             unique_identifier=user_id,
             user_agent=user_agent,
-            cookie=user_cookie
-        )
+            claims=json_cookie
+        ):
+            Session.find(
+                sid=sid,
+                unique_identifier=user_id,
+                user_agent=user_agent,
+                cookie=user_cookie
+            )
 
         user = User.find(user_id=user_id)
 
@@ -939,32 +1011,51 @@ def dashboard(user_id):
             "updatedAt": user["last_login"] if user["last_login"] else datetime.now()
         }
 
-        res = jsonify(result)
+        # updatedAt changes on every request until the first login is recorded
+        etag = make_etag(
+            "dashboard", user_id, user["createdAt"].isoformat(), user["last_login"].isoformat()
+        ) if user["createdAt"] and user["last_login"] else None
+
+        if etag and request.if_none_match.contains_weak(etag):
+            res = Response(status=304)
+        else:
+            res = jsonify(result)
+
+        if etag:
+            res.set_etag(etag)
 
         session = Session.update(
             sid=sid,
-            unique_identifier=user_id
+            unique_identifier=user_id,
+            cookie=user_cookie
         )
 
-        cookie_data = json.dumps({
-            "sid": session["sid"],
-            "cookie": session["data"]
-        })
+        if session["refreshed"]:
+            cookie_data = {
+                "sid": session["sid"],
+                "cookie": session["data"],
+                **Session.claims(
+                    sid=session["sid"],
+                    unique_identifier=user_id,
+                    user_agent=user_agent,
+                    data=session["data"]
+                )
+            }
 
-        e_cookie = cookie.encrypt(cookie_data)
+            e_cookie = cookie.dumps(cookie_data)
 
-        session_data = json.loads(session["data"])
+            session_data = json.loads(session["data"])
 
-        res.set_cookie(
-            cookie_name,
-            e_cookie,
-            max_age=timedelta(milliseconds=session_data["maxAge"]),
-            secure=session_data["secure"],
-            httponly=session_data["httpOnly"],
-            samesite=session_data["sameSite"]
-        )
+            res.set_cookie(
+                cookie_name,
+                e_cookie,
+                max_age=timedelta(milliseconds=session_data["maxAge"]),
+                secure=session_data["secure"],
+                httponly=session_data["httpOnly"],
+                samesite=session_data["sameSite"]
+            )
 
-        return res, 200
+        return res, res.status_code
                 
     except BadRequest as err:
         return str(err), 400
@@ -1012,8 +1103,7 @@ async def update_password(user_id):
         cookie = Cookie()
 
         e_cookie = request.cookies.get(cookie_name)
-        d_cookie = cookie.decrypt(e_cookie)
-        json_cookie = json.loads(d_cookie)
+        json_cookie = cookie.loads(e_cookie)
 
         sid = json_cookie["sid"]
         user_cookie = json_cookie["cookie"]
@@ -1034,50 +1124,49 @@ async def update_password(user_id):
         except Unauthorized:
             raise Forbidden()
 
-        wallets = Grant.find_all(user_id=user["id"])
-
-        for wallet in wallets:
-            grant = Grant.find(user_id=user_id, platform_id=wallet["platformId"])
-            d_grant = Grant.decrypt(grant=grant)
-
-            Grant.purge(
-                originUrl=originUrl,
-                identifier="",
-                platform_name=wallet["platformId"],
-                token=d_grant["token"]
-            )
-
-            Grant.delete(grant=grant)
+        Grant.purge_all(
+            originUrl=originUrl,
+            identifier="",
+            user_id=user["id"]
+        )
 
         User.update(
             user_id=user["id"],
-            password=data.hash(new_password)
+            password=password_hasher.hash(new_password)
         )
 
         res = Response()
 
         session = Session.update(
             sid=sid,
-            unique_identifier=user_id
+            unique_identifier=user_id,
+            cookie=user_cookie
         )
 
-        cookie_data = json.dumps({
-            "sid": session["sid"],
-            "cookie": session["data"]
-        })
+        if session["refreshed"]:
+            cookie_data = {
+                "sid": session["sid"],
+                "cookie": session["data"],
+                **Session.claims(
+                    sid=session["sid"],
+                    unique_identifier=user_id,
+                    user_agent=user_agent,
+                    data=session["data"]
+                )
+            }
 
-        e_cookie = cookie.encrypt(cookie_data)
+            e_cookie = cookie.dumps(cookie_data)
 
-        session_data = json.loads(session["data"])
+            session_data = json.loads(session["data"])
 
-        res.set_cookie(
-            cookie_name,
-            e_cookie,
-            max_age=timedelta(milliseconds=session_data["maxAge"]),
-            secure=session_data["secure"],
-            httponly=session_data["httpOnly"],
-            samesite=session_data["sameSite"]
-        )
+            res.set_cookie(
+                cookie_name,
+                e_cookie,
+                max_age=timedelta(milliseconds=session_data["maxAge"]),
+                secure=session_data["secure"],
+                httponly=session_data["httpOnly"],
+                samesite=session_data["sameSite"]
+            )
 
         return res, 200
                 
@@ -1104,6 +1193,9 @@ async def update_password(user_id):
         logger.exception(err)
         return "internal server error", 500
 
+    finally:
+        release_connection()
+
 @v2.route("/users/<string:user_id>/verify", methods=["POST"])
 def verify_user_id(user_id):
     """
@@ -1136,12 +1228,18 @@ def verify_user_id(user_id):
             user_agent=user_agent
         )
 
-        cookie_data = json.dumps({
+        cookie_data = {
             "sid": session["sid"],
-            "cookie": session["data"]
-        })
+            "cookie": session["data"],
+            **Session.claims(
+                sid=session["sid"],
+                unique_identifier=user["id"],
+                user_agent=user_agent,
+                data=session["data"]
+            )
+        }
 
-        e_cookie = cookie.encrypt(cookie_data)
+        e_cookie = cookie.dumps(cookie_data)
 
         session_data = json.loads(session["data"])
 
@@ -1192,8 +1290,7 @@ def logout(user_id):
         cookie = Cookie()
 
         e_cookie = request.cookies.get(cookie_name)
-        d_cookie = cookie.decrypt(e_cookie)
-        json_cookie = json.loads(d_cookie)
+        json_cookie = cookie.loads(e_cookie)
 
         sid = json_cookie["sid"]
         user_cookie = json_cookie["cookie"]
@@ -1206,6 +1303,8 @@ def logout(user_id):
             cookie=user_cookie
         )
                 
+        Session.revoke(sid=sid)
+
         res = Response()
 
         res.delete_cookie(cookie_name)
@@ -1259,8 +1358,7 @@ async def delete_account(user_id):
         cookie = Cookie()
 
         e_cookie = request.cookies.get(cookie_name)
-        d_cookie = cookie.decrypt(e_cookie)
-        json_cookie = json.loads(d_cookie)
+        json_cookie = cookie.loads(e_cookie)
 
         sid = json_cookie["sid"]
         user_cookie = json_cookie["cookie"]
@@ -1280,25 +1378,18 @@ async def delete_account(user_id):
         except Unauthorized:
             raise Forbidden()
 
-        wallets = Grant.find_all(user_id=user["id"])
-
-        for wallet in wallets:
-            grant = Grant.find(user_id=user_id, platform_id=wallet["platformId"])
-            d_grant = Grant.decrypt(grant=grant)
-
-            Grant.purge(
-                originUrl=originUrl,
-                identifier="",
-                platform_name=wallet["platformId"],
-                token=d_grant["token"]
-            )
-
-            Grant.delete(grant=grant)
+        Grant.purge_all(
+            originUrl=originUrl,
+            identifier="",
+            user_id=user["id"]
+        )
 
         User.delete(
             user_id=user["id"]
         )
 
+        Session.revoke(sid=sid)
+
         Session.create(
             unique_identifier=user["id"],
             user_agent=user_agent,
@@ -1330,4 +1421,7 @@ async def delete_account(user_id):
 
     except Exception as err:
         logger.exception(err)
-        return "internal server error", 500
\ No newline at end of file
+        return "internal server error", 500
+
+    finally:
+        release_connection()
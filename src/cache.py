@@ -0,0 +1,95 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+class TTLCache:
+    """
+    Thread-safe, size-bounded LRU cache whose entries expire after a TTL.
+
+    Attributes:
+        maxsize: int,
+        ttl: float (seconds)
+
+    Methods:
+        get(key: str) -> any,
+        set(key: str, value: any, ttl: float = None) -> None,
+        delete(key: str) -> None,
+        clear() -> None
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        """
+        Arguments:
+            maxsize: int,
+            ttl: float (seconds)
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key: str):
+        """
+        Return the cached value, or None if missing or expired.
+
+        Arguments:
+            key: str
+
+        Returns:
+            any
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return None
+
+            deadline, value = entry
+
+            if deadline <= time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float = None) -> None:
+        """
+        Cache a value. A ttl shorter than the cache's own TTL wins.
+
+        Arguments:
+            key: str,
+            value: any,
+            ttl: float (optional, seconds)
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+
+        with self._lock:
+            if ttl <= 0:
+                self._entries.pop(key, None)
+                return
+
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        """
+        Arguments:
+            key: str
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        """
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,92 @@
+import asyncio
+import atexit
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class EventLoopThread:
+    """
+    A long-lived asyncio event loop running in its own daemon thread.
+
+    Coroutines are submitted from any thread and awaited synchronously, so
+    objects bound to the loop (client connections, sessions) can be reused
+    across requests.
+
+    Methods:
+        run(coro, timeout: float = None) -> any,
+        stop() -> None
+    """
+
+    def __init__(self, name: str = "event-loop") -> None:
+        """
+        Arguments:
+            name: str (optional)
+        """
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _start(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run_forever() -> None:
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run_forever, name=self.name, daemon=True)
+                self._thread.start()
+                ready.wait()
+
+                self._loop = loop
+
+                atexit.register(self.stop)
+
+                logger.debug("started event loop thread %s" % self.name)
+
+            return self._loop
+
+    def run(self, coro, timeout: float = None):
+        """
+        Run a coroutine on the loop and wait for its result.
+
+        Arguments:
+            coro: coroutine,
+            timeout: float (optional, seconds)
+
+        Returns:
+            any
+        """
+        loop = self._start()
+
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("cannot wait on the event loop from its own thread")
+
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+
+        try:
+            return future.result(timeout=timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def stop(self) -> None:
+        """
+        Stop the loop and wait for its thread.
+        """
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+event_loop = EventLoopThread()
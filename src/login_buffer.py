@@ -0,0 +1,181 @@
+import atexit
+import logging
+import threading
+from datetime import datetime
+
+from peewee import Case
+from peewee import PeeweeException
+
+from src.schemas.db_connector import db
+from src.schemas.users import Users
+
+logger = logging.getLogger(__name__)
+
+class LoginBuffer:
+    """
+    Write-behind buffer for login timestamps.
+
+    Logins are coalesced per user and written in one multi-row UPDATE every
+    interval milliseconds, or as soon as size users are pending. The buffer
+    is flushed when the process exits.
+
+    Attributes:
+        interval: int (milliseconds),
+        size: int
+
+    Methods:
+        record(user_id: str, current_login: datetime, now: datetime = None) -> dict,
+        get(user_id: str) -> dict,
+        flush() -> int,
+        stop() -> None
+    """
+
+    def __init__(self, interval: int = 500, size: int = 100) -> None:
+        """
+        Arguments:
+            interval: int (milliseconds),
+            size: int
+        """
+        self.interval = interval
+        self.size = size
+        self._pending = {}
+        self._flushing = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="login-buffer", daemon=True)
+            self._thread.start()
+
+            atexit.register(self.stop)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wake.wait(self.interval / 1000)
+            self._wake.clear()
+
+            try:
+                self.flush()
+            except Exception as error:
+                logger.exception(error)
+
+    def record(self, user_id: str, current_login: datetime, now: datetime = None) -> dict:
+        """
+        Queue a login of a user.
+
+        A pending login takes the place of the current_login read from the
+        users table, which may not have been written yet.
+
+        Arguments:
+            user_id: str,
+            current_login: datetime (users.current_login as read),
+            now: datetime (optional)
+
+        Returns:
+            dict
+        """
+        now = now or datetime.now()
+
+        with self._lock:
+            self._start()
+
+            pending = self._pending.get(user_id) or self._flushing.get(user_id)
+
+            entry = {
+                "last_login": pending["current_login"] if pending else current_login,
+                "current_login": now
+            }
+
+            self._pending[user_id] = entry
+
+            if len(self._pending) >= self.size:
+                self._wake.set()
+
+        return entry
+
+    def get(self, user_id: str) -> dict:
+        """
+        Pending login of a user, or None.
+
+        Arguments:
+            user_id: str
+
+        Returns:
+            dict
+        """
+        with self._lock:
+            return self._pending.get(user_id) or self._flushing.get(user_id)
+
+    def flush(self) -> int:
+        """
+        Write every pending login, size users per UPDATE.
+
+        Entries that fail to write are queued again, behind any newer login
+        of the same user recorded since.
+
+        Returns:
+            int
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._flushing = pending
+
+            if not pending:
+                return 0
+
+            entries = list(pending.items())
+            written = 0
+
+            try:
+                for start in range(0, len(entries), self.size):
+                    batch = entries[start:start + self.size]
+                    user_ids = [user_id for user_id, _ in batch]
+
+                    logger.debug("writing logins of %d users ..." % len(batch))
+
+                    Users.update(
+                        last_login=Case(Users.id, [(user_id, entry["last_login"]) for user_id, entry in batch]),
+                        current_login=Case(Users.id, [(user_id, entry["current_login"]) for user_id, entry in batch])
+                    ).where(
+                        Users.id.in_(user_ids)
+                    ).execute()
+
+                    written += len(batch)
+
+            # InterfaceError (a lost connection) is not a DatabaseError
+            except PeeweeException as error:
+                logger.error("Failed writing %d logins check logs" % (len(entries) - written))
+
+                with self._lock:
+                    for user_id, entry in entries[written:]:
+                        self._pending.setdefault(user_id, entry)
+
+                raise error
+
+            finally:
+                with self._lock:
+                    self._flushing = {}
+
+                if not db.is_closed():
+                    db.close()
+
+            logger.info("- Successfully wrote logins of %d users" % written)
+
+            return written
+
+    def stop(self) -> None:
+        """
+        Stop the flusher and write the remaining logins.
+        """
+        self._stopped.set()
+        self._wake.set()
+
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+        self.flush()
@@ -12,15 +12,18 @@ white_list = Configurations.BROADCAST_WHITELIST
 
 logger = logging.getLogger(__name__)
 
-def publish(body: dict) -> None:
+def publish(body: dict, raise_errors: bool = False) -> None:
     """Publish a broadcast
     
     Keyword arguments:
     body -- content to be published
+    raise_errors -- raise the first failure once every url has been tried
     
     return: None
     """
 
+    errors = []
+
     with open(white_list, "r", encoding='UTF-8') as file_:
         for line in file_:
             if line:
@@ -29,6 +32,9 @@ def publish(body: dict) -> None:
                     url = urlparse(line.rstrip()).geturl()
                     res = requests.delete(url=url, json=body, timeout=30)
 
+                    if raise_errors:
+                        res.raise_for_status()
+
                     logger.debug("[*] Broadcast Response:")
                     logger.debug(res.content)
 
@@ -36,3 +42,7 @@ def publish(body: dict) -> None:
 
                 except Exception as error:
                     logger.exception(error)
+                    errors.append(error)
+
+    if raise_errors and errors:
+        raise errors[0]
@@ -1,8 +1,21 @@
 import logging
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from settings import Configurations
+REVOCATION_WORKERS = Configurations.REVOCATION_WORKERS
+REVOCATION_TIMEOUT = Configurations.REVOCATION_TIMEOUT
+REVOCATION_TIMEOUTS = {
+    platform.lower(): float(timeout) for platform, timeout in json.loads(Configurations.REVOCATION_TIMEOUTS).items()
+}
+ENABLE_REVOCATION_OUTBOX = Configurations.ENABLE_REVOCATION_OUTBOX
+OUTBOX_BACKEND = Configurations.OUTBOX_BACKEND
 
 from peewee import DatabaseError
 
+from src.schemas.db_connector import db
 from src.schemas.wallets import Wallets
 from src.schemas.usersinfo import UsersInfos
 
@@ -12,6 +25,9 @@ from src.security.data import Data
 
 from src.models.broadcast import publish
 
+from src.outbox import create_outbox
+from src.outbox import PermanentJobError
+
 from SwobThirdPartyPlatforms import ImportPlatform
 from SwobThirdPartyPlatforms.exceptions import PlatformDoesNotExist
 
@@ -23,6 +39,10 @@ GrantObject = ()
 
 logger = logging.getLogger(__name__)
 
+revocation_executor = ThreadPoolExecutor(max_workers=REVOCATION_WORKERS, thread_name_prefix="revocation")
+
+outbox = create_outbox(backend=OUTBOX_BACKEND)
+
 class Grant_Model:
     def __init__(self) -> None:
         self.Wallets = Wallets
@@ -38,7 +58,7 @@ class Grant_Model:
         logger.debug("Storing %s grant for %s ..." % (platformName, user_id))
 
         try:
-            self.Wallets.get(self.Wallets.uniqueIdHash == data.hash(grant["profile"]["unique_id"]))
+            self.Wallets.get(self.Wallets.uniqueIdHash.in_(data.hashes(grant["profile"]["unique_id"])))
 
         except self.Wallets.DoesNotExist:
             try:
@@ -103,6 +123,51 @@ class Grant_Model:
             logger.error("Failed deleting grant")
             raise InternalServerError(error)
 
+    def delete_all(self, user_id: str, platform_ids: list = None) -> int:
+        """
+        Delete the grants of a user in a single statement.
+
+        Arguments:
+            user_id: str,
+            platform_ids: list (optional, only delete these platforms)
+
+        Returns:
+            int
+        """
+        try:
+            logger.debug("Deleting grants for user_id:%s ..." % user_id)
+
+            data = self.Data()
+
+            query = self.Wallets.delete().where(self.Wallets.userId == user_id)
+
+            if platform_ids is not None:
+                if not platform_ids:
+                    return 0
+
+                query = query.where(self.Wallets.platformId.in_(platform_ids))
+
+            rows = query.execute()
+
+            if rows:
+                msisdn_hash = self.UsersInfos.get(self.UsersInfos.userId == user_id).full_phone_number
+                body = {
+                    "msisdn_hashed": data.encrypt(data=msisdn_hash)
+                }
+
+                if ENABLE_REVOCATION_OUTBOX:
+                    outbox.enqueue(kind="broadcast", payload=body)
+                else:
+                    publish(body=body)
+
+            logger.info("- Successfully deleted %d grants" % rows)
+
+            return rows
+
+        except DatabaseError as error:
+            logger.error("Failed deleting grants")
+            raise InternalServerError(error)
+
     def find(self, user_id: str, platform_id: str) -> GrantObject:
         """
         """
@@ -128,12 +193,11 @@ class Grant_Model:
         try:
             logger.debug("Finding all grants for user_id:%s ..." % user_id)
 
-            grant = (
+            grant = list(
                 self.Wallets.select()
                 .where(
                     self.Wallets.userId == user_id
                 )
-                .dicts()
             )
 
             logger.info("- Successfully found grants")
@@ -143,7 +207,7 @@ class Grant_Model:
         except DatabaseError as error:
             raise InternalServerError(error)
 
-    def purge(self, originUrl: str, identifier: str, platform_name: str, token: str) -> None:
+    def purge(self, originUrl: str, identifier: str, platform_name: str, token: str, raise_errors: bool = False, timeout: float = None) -> None:
         """
         """
         try:
@@ -158,6 +222,159 @@ class Grant_Model:
             if protocol == "oauth2":
                 Protocol = OAuth2(origin=originUrl, platform_name=platform_name)
             elif protocol == "twofactor":
-                Protocol = TwoFactor(identifier=identifier, platform_name=platform_name)
+                Protocol = TwoFactor(identifier=identifier, platform_name=platform_name, timeout=timeout)
+
+            Protocol.invalidation(token=token, raise_errors=raise_errors)
+
+    def purge_all(self, originUrl: str, identifier: str, user_id: str) -> dict:
+        """
+        Invalidate and delete every grant of a user.
+
+        The platforms are invalidated concurrently, each within its own
+        timeout (REVOCATION_TIMEOUTS, else REVOCATION_TIMEOUT). A platform
+        that times out is logged and its grant deleted, like a platform
+        whose invalidation fails; a two-factor call is cancelled at its
+        timeout, an OAuth2 call keeps running in the background.
+        A platform that raises does not stop the others: the other grants
+        are deleted and the first error is raised.
+
+        The grants are fetched once and deleted with a single statement.
+
+        With ENABLE_REVOCATION_OUTBOX, the invalidations are queued instead
+        (see enqueue_all).
+
+        Arguments:
+            originUrl: str,
+            identifier: str,
+            user_id: str
+
+        Returns:
+            dict (platform_id: "revoked", "timeout", "failed" or "queued")
+        """
+        if ENABLE_REVOCATION_OUTBOX:
+            return self.enqueue_all(originUrl=originUrl, identifier=identifier, user_id=user_id)
+
+        grants = self.find_all(user_id=user_id)
+        futures = {}
+
+        for grant in grants:
+            d_grant = self.decrypt(grant=grant)
+
+            futures[grant.platformId] = revocation_executor.submit(
+                self.purge,
+                originUrl=originUrl,
+                identifier=identifier,
+                platform_name=grant.platformId,
+                token=d_grant["token"],
+                timeout=REVOCATION_TIMEOUTS.get(grant.platformId.lower(), REVOCATION_TIMEOUT)
+            )
+
+        started = time.monotonic()
+        results = {}
+        errors = []
 
-            Protocol.invalidation(token=token)
\ No newline at end of file
+        for platform_id, future in futures.items():
+            timeout = REVOCATION_TIMEOUTS.get(platform_id.lower(), REVOCATION_TIMEOUT)
+
+            try:
+                future.result(timeout=max(started + timeout - time.monotonic(), 0))
+
+                results[platform_id] = "revoked"
+
+            except FutureTimeoutError:
+                logger.error("Invalidating %s grant for %s timed out after %ss" % (platform_id, user_id, timeout))
+                results[platform_id] = "timeout"
+
+            except Exception as error:
+                logger.error("Failed invalidating %s grant for %s" % (platform_id, user_id))
+                results[platform_id] = "failed"
+                errors.append(error)
+
+        if errors:
+            self.delete_all(
+                user_id=user_id,
+                platform_ids=[platform_id for platform_id, result in results.items() if result != "failed"]
+            )
+            raise errors[0]
+
+        self.delete_all(user_id=user_id)
+
+        return results
+
+    def enqueue_all(self, originUrl: str, identifier: str, user_id: str) -> dict:
+        """
+        Delete every grant of a user and queue the invalidation of their
+        tokens and the broadcast in the outbox, in a single transaction.
+
+        The tokens are queued as stored, encrypted.
+
+        Arguments:
+            originUrl: str,
+            identifier: str,
+            user_id: str
+
+        Returns:
+            dict (platform_id: "queued")
+        """
+        try:
+            with db.atomic():
+                grants = self.find_all(user_id=user_id)
+
+                for grant in grants:
+                    outbox.enqueue(kind="revoke", payload={
+                        "originUrl": originUrl,
+                        "identifier": identifier,
+                        "platform_id": grant.platformId,
+                        "token": grant.token
+                    })
+
+                self.delete_all(user_id=user_id)
+
+            logger.info("- Successfully queued %d grant invalidations" % len(grants))
+
+            return {grant.platformId: "queued" for grant in grants}
+
+        except DatabaseError as error:
+            logger.error("Failed queueing grant invalidations")
+            raise InternalServerError(error)
+
+    def revoke(self, payload: dict) -> None:
+        """
+        Outbox handler invalidating a queued token.
+
+        Arguments:
+            payload: dict
+        """
+        data = self.Data()
+        platform_id = payload["platform_id"]
+        token = json.loads(data.decrypt(data=payload["token"]))
+
+        timeout = REVOCATION_TIMEOUTS.get(platform_id.lower(), REVOCATION_TIMEOUT)
+
+        future = revocation_executor.submit(
+            self.purge,
+            originUrl=payload["originUrl"],
+            identifier=payload["identifier"],
+            platform_name=platform_id,
+            token=token,
+            raise_errors=True,
+            timeout=timeout
+        )
+
+        try:
+            future.result(timeout=timeout)
+
+        except BadRequest as error:
+            raise PermanentJobError("invalid platform name: %s" % platform_id) from error
+
+def outbox_handlers() -> dict:
+    """
+    Outbox job handlers, by kind.
+
+    Returns:
+        dict
+    """
+    return {
+        "revoke": Grant_Model().revoke,
+        "broadcast": lambda payload: publish(body=payload, raise_errors=True)
+    }
@@ -0,0 +1,339 @@
+import logging
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+from playhouse.shortcuts import model_to_dict
+
+from src.schemas.sessions import Sessions
+
+logger = logging.getLogger(__name__)
+
+REVOKED = "revoked"
+
+class SessionStoreError(Exception):
+    """
+    Raised when a key-value session store cannot be reached.
+    """
+
+class SessionStore(ABC):
+    """
+    Storage backend for sessions.
+
+    A session is a dict with the columns of the sessions table: sid,
+    unique_identifier, user_agent, expires, data, status, type and createdAt.
+
+    Methods:
+        create(session: dict) -> None,
+        get(sid: str) -> dict,
+        update(sid: str, unique_identifier: str, type: str, data: str, status: str) -> int,
+        revoke(sid: str) -> int
+    """
+
+    @abstractmethod
+    def create(self, session: dict) -> None:
+        """
+        Store a new session.
+
+        Arguments:
+            session: dict
+        """
+
+    @abstractmethod
+    def get(self, sid: str) -> dict:
+        """
+        Fetch a session, or None if there is none.
+
+        Arguments:
+            sid: str
+
+        Returns:
+            dict
+        """
+
+    @abstractmethod
+    def update(self, sid: str, unique_identifier: str, type: str, data: str, status: str) -> int:
+        """
+        Set data and status of the session matching sid, unique_identifier
+        and type, unless it is revoked.
+
+        Arguments:
+            sid: str,
+            unique_identifier: str,
+            type: str,
+            data: str,
+            status: str
+
+        Returns:
+            int (number of sessions matched)
+        """
+
+    @abstractmethod
+    def revoke(self, sid: str) -> int:
+        """
+        Mark a session revoked, for every worker.
+
+        Arguments:
+            sid: str
+
+        Returns:
+            int (number of sessions matched)
+        """
+
+class MySQLSessionStore(SessionStore):
+    """
+    Sessions kept in the MySQL sessions table.
+    """
+
+    def __init__(self) -> None:
+        """
+        """
+        self.Sessions = Sessions
+
+    def create(self, session: dict) -> None:
+        self.Sessions.create(**session)
+
+    def get(self, sid: str) -> dict:
+        session = self.Sessions.get_or_none(self.Sessions.sid == sid)
+
+        return model_to_dict(session) if session else None
+
+    def update(self, sid: str, unique_identifier: str, type: str, data: str, status: str) -> int:
+        return (
+            self.Sessions.update(
+                data=data,
+                status=status
+            )
+            .where(
+                self.Sessions.sid == sid,
+                self.Sessions.unique_identifier == unique_identifier,
+                self.Sessions.type == type,
+                # a revoked session stays revoked; status is NULL for most sessions
+                (self.Sessions.status.is_null()) | (self.Sessions.status != REVOKED)
+            )
+            .execute()
+        )
+
+    def revoke(self, sid: str) -> int:
+        return (
+            self.Sessions.update(status=REVOKED)
+            .where(self.Sessions.sid == sid)
+            .execute()
+        )
+
+# compare-and-set of session fields in one step; ARGV[1] holds the fields
+# to match and ARGV[2] the fields to set, as JSON objects. A revoked session
+# is never changed.
+UPDATE_SCRIPT = """
+local value = redis.call('GET', KEYS[1])
+if not value then return 0 end
+
+local session = cjson.decode(value)
+if session['status'] == 'revoked' then return 0 end
+
+for field, expected in pairs(cjson.decode(ARGV[1])) do
+    if session[field] ~= expected then return 0 end
+end
+
+for field, new in pairs(cjson.decode(ARGV[2])) do
+    session[field] = new
+end
+
+local ttl = redis.call('PTTL', KEYS[1])
+
+if ttl > 0 then
+    redis.call('SET', KEYS[1], cjson.encode(session), 'PX', ttl)
+else
+    redis.call('SET', KEYS[1], cjson.encode(session))
+end
+
+return 1
+"""
+
+class KeyValueSessionStore(SessionStore):
+    """
+    Sessions kept in a Redis-protocol key-value store, one key per session.
+    Keys expire natively with the session, so no reaper is needed.
+
+    Attributes:
+        client: Redis client (redis.Redis or FakeRedis),
+        errors: tuple (optional, client exceptions raised as SessionStoreError),
+        prefix: str (optional)
+    """
+
+    def __init__(self, client, errors: tuple = (ConnectionError, OSError), prefix: str = "session:") -> None:
+        """
+        Arguments:
+            client: Redis client,
+            errors: tuple (optional),
+            prefix: str (optional)
+        """
+        self.client = client
+        self.errors = errors
+        self.prefix = prefix
+        self._update = client.register_script(UPDATE_SCRIPT)
+
+    def _ttl(self, session: dict) -> int:
+        return max(int((session["expires"] - datetime.now()).total_seconds() * 1000), 1)
+
+    def _dumps(self, session: dict) -> str:
+        return json.dumps({
+            **session,
+            "expires": session["expires"].isoformat(),
+            "createdAt": session["createdAt"].isoformat() if session.get("createdAt") else None
+        })
+
+    def _loads(self, value: bytes) -> dict:
+        session = json.loads(value)
+        session["expires"] = datetime.fromisoformat(session["expires"])
+        session["createdAt"] = datetime.fromisoformat(session["createdAt"]) if session["createdAt"] else None
+
+        return session
+
+    def create(self, session: dict) -> None:
+        try:
+            self.client.set(self.prefix + session["sid"], self._dumps(session), px=self._ttl(session))
+        except self.errors as error:
+            raise SessionStoreError(error) from error
+
+    def get(self, sid: str) -> dict:
+        try:
+            value = self.client.get(self.prefix + sid)
+        except self.errors as error:
+            raise SessionStoreError(error) from error
+
+        return self._loads(value) if value else None
+
+    def update(self, sid: str, unique_identifier: str, type: str, data: str, status: str) -> int:
+        try:
+            return int(self._update(
+                keys=[self.prefix + sid],
+                args=[
+                    json.dumps({"unique_identifier": unique_identifier, "type": type}),
+                    json.dumps({"data": data, "status": status})
+                ]
+            ))
+        except self.errors as error:
+            raise SessionStoreError(error) from error
+
+    def revoke(self, sid: str) -> int:
+        try:
+            return int(self._update(
+                keys=[self.prefix + sid],
+                args=[json.dumps({}), json.dumps({"status": REVOKED})]
+            ))
+        except self.errors as error:
+            raise SessionStoreError(error) from error
+
+class FakeRedis:
+    """
+    In-process stand-in for the subset of the redis.Redis client used by
+    KeyValueSessionStore, for single-worker development.
+
+    Methods:
+        get(name: str) -> bytes,
+        set(name: str, value: str, px: int = None, xx: bool = False) -> bool,
+        delete(*names: str) -> int,
+        register_script(script: str) -> callable
+    """
+
+    def __init__(self) -> None:
+        """
+        """
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, name: str):
+        entry = self._data.get(name)
+
+        if entry and entry[0] is not None and entry[0] <= time.monotonic():
+            del self._data[name]
+            return None
+
+        return entry
+
+    def get(self, name: str) -> bytes:
+        with self._lock:
+            entry = self._alive(name)
+            return entry[1] if entry else None
+
+    def set(self, name: str, value: str, px: int = None, xx: bool = False) -> bool:
+        with self._lock:
+            if xx and not self._alive(name):
+                return None
+
+            deadline = time.monotonic() + px / 1000 if px else None
+            self._data[name] = (deadline, value.encode("utf-8") if isinstance(value, str) else value)
+
+            return True
+
+    def delete(self, *names: str) -> int:
+        with self._lock:
+            return sum(1 for name in names if self._alive(name) and self._data.pop(name))
+
+    def register_script(self, script: str):
+        """
+        Python equivalent of a Lua script of the session store.
+
+        Arguments:
+            script: str
+
+        Returns:
+            callable
+        """
+        if script != UPDATE_SCRIPT:
+            raise ValueError("Unknown script")
+
+        def update(keys: list, args: list) -> int:
+            with self._lock:
+                entry = self._alive(keys[0])
+
+                if not entry:
+                    return 0
+
+                session = json.loads(entry[1])
+
+                if session.get("status") == REVOKED:
+                    return 0
+
+                if any(session.get(field) != expected for field, expected in json.loads(args[0]).items()):
+                    return 0
+
+                session.update(json.loads(args[1]))
+                self._data[keys[0]] = (entry[0], json.dumps(session).encode("utf-8"))
+
+                return 1
+
+        return update
+
+def create_session_store(backend: str, url: str = None) -> SessionStore:
+    """
+    Build the session store named by SESSION_STORE.
+
+    Arguments:
+        backend: str ("mysql", "redis" or "memory"),
+        url: str (optional, redis URL)
+
+    Returns:
+        SessionStore
+    """
+    backend = backend.lower()
+
+    if backend == "mysql":
+        return MySQLSessionStore()
+
+    if backend == "redis":
+        import redis
+
+        return KeyValueSessionStore(
+            client=redis.Redis.from_url(url),
+            errors=(redis.exceptions.RedisError,)
+        )
+
+    if backend == "memory":
+        logger.warning("Using in-process session store, sessions are not shared between workers")
+        return KeyValueSessionStore(client=FakeRedis())
+
+    raise ValueError("Unknown session store '%s'" % backend)
@@ -9,20 +9,65 @@ from settings import Configurations
 secure = Configurations.SECURE_COOKIE
 cookie_maxage = Configurations.COOKIE_MAXAGE
 session_maxage = Configurations.SESSION_MAXAGE
+refresh_threshold = Configurations.SESSION_REFRESH_THRESHOLD
+enable_session_cache = Configurations.ENABLE_SESSION_CACHE
+session_cache_size = Configurations.SESSION_CACHE_SIZE
+session_cache_ttl = Configurations.SESSION_CACHE_TTL
+stateless_sessions = Configurations.ENABLE_STATELESS_SESSIONS
+session_version = Configurations.SESSION_VERSION
+revocation_list_size = Configurations.REVOCATION_LIST_SIZE
+session_store_backend = Configurations.SESSION_STORE
+session_store_url = Configurations.SESSION_STORE_URL
+
+import uuid
 
 from peewee import DatabaseError
 
-from src.schemas.sessions import Sessions
+from src.models.session_store import create_session_store, KeyValueSessionStore, SessionStoreError, REVOKED
+
+from src.cache import TTLCache
+
+from src.security.cookie import Cookie
 
 from werkzeug.exceptions import InternalServerError
 from werkzeug.exceptions import Conflict
 from werkzeug.exceptions import Unauthorized
 
+session_store = create_session_store(backend=session_store_backend, url=session_store_url)
+
+# the revocation check of signed cookies must not read the sessions table
+if stateless_sessions and not isinstance(session_store, KeyValueSessionStore):
+    logger.warning("Stateless sessions need a key-value SESSION_STORE, turning them off")
+    stateless_sessions = False
+
+session_cache = TTLCache(maxsize=session_cache_size, ttl=session_cache_ttl) if enable_session_cache else None
+
+# sids logged out in this worker, saving a store read; a cookie cannot outlive COOKIE_MAXAGE
+revoked_sessions = TTLCache(maxsize=revocation_list_size, ttl=float(cookie_maxage) / 1000)
+
+def cache_session(session: dict) -> None:
+    """
+    Write a session row through to the session cache until it expires.
+
+    Arguments:
+        session: dict
+    """
+    if session_cache is None:
+        return
+
+    if not session["expires"]:
+        session_cache.delete(str(session["sid"]))
+        return
+
+    ttl = session["expires"].timestamp() - datetime.now().timestamp()
+    session_cache.set(str(session["sid"]), session, ttl=ttl)
+
 class Session_Model:
     def __init__(self) -> None:
         """
         """
-        self.Sessions = Sessions
+        self.store = session_store
+        self.Cookie = Cookie
         self.cookie_data = {
             "maxAge": cookie_maxage,
             "expires": str(datetime.now() + timedelta(milliseconds=cookie_maxage)),
@@ -49,27 +94,33 @@ class Session_Model:
 
             logger.debug("creating session for %s ..." % unique_identifier)
 
-            session = self.Sessions.create(
-                unique_identifier=unique_identifier,
-                user_agent=user_agent,
-                expires=expires,
-                data=json.dumps(self.cookie_data),
-                status=status,
-                type=type
-            )
+            session = {
+                "sid": str(uuid.uuid4()),
+                "unique_identifier": unique_identifier,
+                "user_agent": user_agent,
+                "expires": expires,
+                "data": json.dumps(self.cookie_data),
+                "status": status,
+                "type": type,
+                "createdAt": datetime.now()
+            }
+
+            self.store.create(session)
+
+            cache_session(session)
 
             logger.info(
-                "- SUCCESSFULLY CREATED SESSION %s FOR %s" % (str(session), unique_identifier) 
+                "- SUCCESSFULLY CREATED SESSION %s FOR %s" % (session["sid"], unique_identifier) 
             )
 
             return {
-                "sid": str(session.sid),
-                "uid": session.unique_identifier,
-                "data": session.data,
-                "type": session.type
+                "sid": session["sid"],
+                "uid": session["unique_identifier"],
+                "data": session["data"],
+                "type": session["type"]
             }
 
-        except DatabaseError as err:
+        except (DatabaseError, SessionStoreError) as err:
             logger.error("FAILED TO CREATE SESSION FOR %s CHECK LOGS" % unique_identifier)
             raise InternalServerError(err)
 
@@ -79,48 +130,52 @@ class Session_Model:
         try:
             logger.debug("finding session %s for user %s ..." % (sid, unique_identifier))
 
-            result = []
+            if revoked_sessions.get(sid):
+                logger.error("Revoked session %s" % sid)
+                raise Unauthorized()
 
-            sessions = (
-                self.Sessions.select()
-                .where(
-                    self.Sessions.sid == sid,
-                    self.Sessions.unique_identifier == unique_identifier,
-                    self.Sessions.user_agent == user_agent,
-                    self.Sessions.status == status,
-                    self.Sessions.type == type
+            def matches(session: dict) -> bool:
+                return (
+                    session["unique_identifier"] == unique_identifier
+                    and session["user_agent"] == user_agent
+                    and session["status"] == status
+                    and session["type"] == type
                 )
-                .dicts()
-            )
 
-            for session in sessions:
-                result.append(session)
+            session = session_cache.get(sid) if session_cache is not None else None
 
-            # check for duplicates
-            if len(result) > 1:
-                logger.error("Multiple sessions %s found" % sid)
-                raise Conflict()
+            # a cached session that disagrees may have been changed by another worker
+            if session and (not matches(session) or session["data"] != cookie):
+                session = None
 
-            # check for no user
-            if len(result) < 1:
-                logger.error("No session %s found" % sid)
-                raise Unauthorized()
+            if session:
+                logger.debug("session %s found in cache" % sid)
 
-            expires = result[0]["expires"]
+            else:
+                session = self.store.get(sid)
+
+                # check for no session
+                if not session or not matches(session):
+                    logger.error("No session %s found" % sid)
+                    raise Unauthorized()
+
+                cache_session(session)
+
+            expires = session["expires"]
             age = expires.timestamp() - datetime.now().timestamp()
 
             if age <= 0:
                 logger.error("Expired session %s" % sid)
                 raise Unauthorized()
 
-            if result[0]["data"] != cookie:
+            if session["data"] != cookie:
                 logger.error("Invalid cookie data")
-                logger.error('Original cokkie: %s' % result[0]["data"])
+                logger.error('Original cokkie: %s' % session["data"])
                 logger.error("Invalid cokkie: %s" % cookie)
                 raise Unauthorized()
 
             else:
-                cookie_expire = datetime.strptime(json.loads(cookie)["expires"], '%Y-%m-%d %H:%M:%S.%f')
+                cookie_expire = datetime.fromisoformat(json.loads(cookie)["expires"])
                 cookie_age = cookie_expire.timestamp() - datetime.now().timestamp()
 
                 if cookie_age <= 0:
@@ -128,78 +183,215 @@ class Session_Model:
                     raise Unauthorized()
 
             logger.info("SESSION %s FOUND" % sid)
-            return str(result[0]["unique_identifier"])
+            return str(session["unique_identifier"])
+
+        except (DatabaseError, SessionStoreError) as err:
+            logger.error("FAILED FINDING SESSION %s CHECK LOGS" % sid)
+            raise InternalServerError(err)
+
+    def claims(self, sid: str, unique_identifier: str, user_agent: str, data: str) -> dict:
+        """
+        Signed claims for a session cookie, letting read-only routes authorise
+        it without a database lookup (see authorize). Empty when stateless
+        sessions are turned off.
+
+        Arguments:
+            sid: str,
+            unique_identifier: str,
+            user_agent: str,
+            data: str
+
+        Returns:
+            dict
+        """
+        if not stateless_sessions:
+            return {}
+
+        cookie_expire = datetime.fromisoformat(json.loads(data)["expires"])
+        exp = int(cookie_expire.timestamp())
+
+        return {
+            "exp": exp,
+            "ver": session_version,
+            "sig": self.Cookie().sign(
+                "%s|%s|%s|%d|%d" % (sid, unique_identifier, user_agent, exp, session_version)
+            )
+        }
+
+    def authorize(self, sid: str, unique_identifier: str, user_agent: str, claims: dict) -> bool:
+        """
+        Authorise a session from the signed claims in its cookie.
+
+        Returns False when the claims are missing, stale or do not verify, in
+        which case the caller should fall back to find. Verified claims still
+        need the session to exist and not be revoked in the key-value session
+        store, so a logout in another worker is honoured at once without a
+        database lookup.
 
-        except DatabaseError as err:
+        Arguments:
+            sid: str,
+            unique_identifier: str,
+            user_agent: str,
+            claims: dict
+
+        Returns:
+            bool
+        """
+        if not stateless_sessions:
+            return False
+
+        if revoked_sessions.get(sid):
+            logger.error("Revoked session %s" % sid)
+            raise Unauthorized()
+
+        exp = claims.get("exp")
+        ver = claims.get("ver")
+        sig = claims.get("sig")
+
+        if not sig or ver != session_version or not isinstance(exp, int):
+            return False
+
+        if exp <= datetime.now().timestamp():
+            logger.debug("Expired signed session %s" % sid)
+            return False
+
+        if not self.Cookie().verify(
+            "%s|%s|%s|%d|%d" % (sid, unique_identifier, user_agent, exp, ver), sig
+        ):
+            logger.error("Invalid signed session %s" % sid)
+            return False
+
+        try:
+            session = self.store.get(sid)
+
+        except (DatabaseError, SessionStoreError) as err:
             logger.error("FAILED FINDING SESSION %s CHECK LOGS" % sid)
             raise InternalServerError(err)
 
-    def update(self, sid: str, unique_identifier: str, status: str = None, type: str = None) -> dict:
+        if not session or session["status"] == REVOKED:
+            logger.error("Revoked session %s" % sid)
+            raise Unauthorized()
+
+        logger.info("SESSION %s AUTHORIZED" % sid)
+        return True
+
+    def revoke(self, sid: str) -> None:
+        """
+        Revoke a session in the session store, and in this worker for the
+        lifetime of its cookie.
+
+        Arguments:
+            sid: str
+        """
+        try:
+            self.store.revoke(sid)
+
+        except (DatabaseError, SessionStoreError) as err:
+            logger.error("FAILED REVOKING SESSION %s CHECK LOGS" % sid)
+            raise InternalServerError(err)
+
+        revoked_sessions.set(sid, True)
+
+        if session_cache is not None:
+            session_cache.delete(sid)
+
+        logger.info("- Revoked session %s" % sid)
+
+    def is_fresh(self, cookie: str) -> bool:
+        """
+        Check whether less than SESSION_REFRESH_THRESHOLD of the cookie's
+        max age has elapsed since it was issued.
+
+        Arguments:
+            cookie: str
+
+        Returns:
+            bool
+        """
+        cookie_data = json.loads(cookie)
+
+        cookie_expire = datetime.fromisoformat(cookie_data["expires"])
+        cookie_maxage_ms = float(cookie_data["maxAge"])
+        elapsed = cookie_maxage_ms - (cookie_expire.timestamp() - datetime.now().timestamp()) * 1000
+
+        return elapsed < refresh_threshold * float(cookie_maxage)
+
+    def update(self, sid: str, unique_identifier: str, status: str = None, type: str = None, cookie: str = None) -> dict:
         try:
             """
             Update session in database.
 
+            When the cookie data the client presented is passed in and is still
+            fresh (see is_fresh), the session is returned as is without writing
+            to the database and "refreshed" is False; the caller should then
+            keep the client's existing cookie.
+
             Arguments:
                 sid: str,
                 unique_identifier: str,
                 status: str,
-                type: str
+                type: str,
+                cookie: str (optional)
 
             Returns:
                 dict
             """
 
-            logger.debug("finding session %s for user %s ..." % (sid, unique_identifier))
+            if cookie and self.is_fresh(cookie=cookie):
+                logger.debug("session %s is fresh, skipping refresh ..." % sid)
 
-            result = []
+                return {
+                    "sid": sid,
+                    "uid": unique_identifier,
+                    "data": cookie,
+                    "type": type,
+                    "refreshed": False
+                }
 
-            sessions = (
-                self.Sessions.select()
-                .where(
-                    self.Sessions.sid == sid,
-                    self.Sessions.unique_identifier == unique_identifier,
-                    self.Sessions.type == type
-                )
-            )
+            logger.debug("updating session %s for user %s ..." % (sid, unique_identifier))
+
+            data = json.dumps(self.cookie_data)
 
-            for session in sessions:
-                result.append(session)
+            # a single conditional update; the matched count replaces a lookup
+            rows = self.store.update(
+                sid=sid,
+                unique_identifier=unique_identifier,
+                type=type,
+                data=data,
+                status=status
+            )
 
             # check for duplicates
-            if len(result) > 1:
+            if rows > 1:
                 logger.error("Multiple sessions %s found" % sid)
                 raise Conflict()
 
             # check for no user
-            if len(result) < 1:
+            if rows < 1:
                 logger.error("No session %s found" % sid)
                 raise Unauthorized()
 
-            logger.debug("updating session %s for user %s ..." % (sid, unique_identifier))
+            if session_cache is not None:
+                cached = session_cache.get(sid)
 
-            upd_session = (
-                self.Sessions.update(
-                    data=json.dumps(self.cookie_data),
-                    status=status
-                )
-                .where(
-                    self.Sessions.sid == sid,
-                    self.Sessions.unique_identifier == unique_identifier,
-                    self.Sessions.type == type
-                )
-            )
-                
-            upd_session.execute()
+                if cached and cached["unique_identifier"] == unique_identifier and cached["type"] == type:
+                    session = dict(cached)
+                    session["data"] = data
+                    session["status"] = status
+                    cache_session(session)
+                else:
+                    session_cache.delete(sid)
 
             logger.info("- SUCCESSFULLY UPDATED SESSION %s" % sid)
             
             return {
                 "sid": sid,
                 "uid": unique_identifier,
-                "data": json.dumps(self.cookie_data),
-                "type": type
+                "data": data,
+                "type": type,
+                "refreshed": True
             }
 
-        except DatabaseError as err:
+        except (DatabaseError, SessionStoreError) as err:
             logger.error("FAILED UPDATING SESSION %s CHECK LOGS" % sid)
             raise InternalServerError(err)
@@ -13,8 +13,15 @@ ATTEMPTS = Configurations.SHORT_BLOCK_ATTEMPTS
 BLOCKS = Configurations.LONG_BLOCK_ATTEMPTS
 ATTEMPTS_TIME = Configurations.SHORT_BLOCK_DURATION
 BLOCKS_TIME = Configurations.LONG_BLOCK_DURATION
+ENABLE_LOGIN_BUFFER = Configurations.ENABLE_LOGIN_BUFFER
+LOGIN_BUFFER_INTERVAL = Configurations.LOGIN_BUFFER_INTERVAL
+LOGIN_BUFFER_SIZE = Configurations.LOGIN_BUFFER_SIZE
 
 from peewee import DatabaseError
+from peewee import IntegrityError
+from peewee import JOIN
+from peewee import Value
+from peewee import fn
 
 from src.schemas.db_connector import db
 from src.schemas.users import Users
@@ -22,9 +29,12 @@ from src.schemas.usersinfo import UsersInfos
 from src.schemas.retries import Retries
 from src.schemas.wallets import Wallets
 
-from SwobThirdPartyPlatforms import ImportPlatform, available_platforms
+from src.login_buffer import LoginBuffer
+
+from src.platforms import catalog
 
 from src.security.data import Data
+from src.security.password import password_hasher
 
 from werkzeug.exceptions import Unauthorized
 from werkzeug.exceptions import BadRequest
@@ -35,6 +45,8 @@ from werkzeug.exceptions import InternalServerError
 UserObject = ()
 UserPlatformObject= ()
 
+login_buffer = LoginBuffer(interval=LOGIN_BUFFER_INTERVAL, size=LOGIN_BUFFER_SIZE) if ENABLE_LOGIN_BUFFER else None
+
 class User_Model:
     def __init__(self) -> None:
         """
@@ -46,60 +58,61 @@ class User_Model:
         self.Data = Data
         self.Wallets = Wallets
 
-    def create(self, phone_number: str, country_code: str, name: str, password: str) -> str:
+    def create(self, phone_number: str, country_code: str, name: str, password: str, phone_number_hash: str = None) -> str:
         """
         """
         try:
             data = self.Data()
             full_phone_number = country_code+phone_number
-            phone_number_hash = data.hash(data=full_phone_number)
+            phone_number_hash = phone_number_hash or data.hash(data=full_phone_number)
 
-            logger.debug("Finding verified userinfo: %s" % phone_number_hash)
-
-            result = []
+            logger.debug("creating user '%s' ..." % phone_number_hash)
 
-            userinfos = (
-                self.UsersInfos.select()
-                .where(
-                    self.UsersInfos.full_phone_number == phone_number_hash,
-                    self.UsersInfos.status == "verified"
-                )
-                .dicts()
-            )
-
-            for userinfo in userinfos:
-                result.append(userinfo)
-
-            # check for duplicate user
-            if len(result) > 1:
-                logger.error("Duplicate verified users found: %s" % phone_number_hash)
-                raise Conflict()
-
-            logger.info("- Successfully found verified users: %s" % phone_number_hash)
-
-            # check for no user
-            if len(result) < 1:
-                logger.debug("creating user '%s' ..." % phone_number_hash)
-
-                data = self.Data()
-                password_hash = data.hash(password)
+            password_hash = password_hasher.hash(password)
 
+            with self.db.atomic():
                 new_user = self.Users.create(
                     password = password_hash
                 )
 
-                self.UsersInfos.create(
-                    name = data.encrypt(data=name),
-                    country_code = data.encrypt(data=country_code),
-                    full_phone_number = phone_number_hash,
-                    userId= new_user.id,
+                # the userinfo is only inserted if no verified account holds the
+                # phone number, the unique verified_phone_number settles races
+                verified = (
+                    self.UsersInfos.select(self.UsersInfos.id)
+                    .where(
+                        self.UsersInfos.full_phone_number.in_(data.hashes(full_phone_number)),
+                        self.UsersInfos.status == "verified"
+                    )
                 )
 
-                logger.info("- User '%s' successfully created" % phone_number_hash)
-                return str(new_user.id)
-            else:
-                logger.error("user '%s' already has an acount" % phone_number_hash)
-                raise Conflict()
+                rows = self.UsersInfos.insert_from(
+                    self.Users.select(
+                        Value(data.encrypt(data=name)),
+                        Value(data.encrypt(data=country_code)),
+                        Value(phone_number_hash),
+                        Value("unverified"),
+                        self.Users.id,
+                        Value(datetime.now())
+                    ).where(
+                        self.Users.id == new_user.id,
+                        ~fn.EXISTS(verified)
+                    ),
+                    fields=[
+                        self.UsersInfos.name,
+                        self.UsersInfos.country_code,
+                        self.UsersInfos.full_phone_number,
+                        self.UsersInfos.status,
+                        self.UsersInfos.userId,
+                        self.UsersInfos.createdAt
+                    ]
+                ).as_rowcount().execute()
+
+                if rows < 1:
+                    logger.error("user '%s' already has an acount" % phone_number_hash)
+                    raise Conflict()
+
+            logger.info("- User '%s' successfully created" % phone_number_hash)
+            return str(new_user.id)
 
         except DatabaseError as err:
             logger.error("creating user '%s' failed check logs" % full_phone_number)
@@ -110,140 +123,183 @@ class User_Model:
         """
         try:
             data = self.Data()
-            password_hash = data.hash(password)
 
             if phone_number:
-                phone_number_hash = data.hash(phone_number)
+                unique_id = data.hash(phone_number)
 
-                if ENABLE_BLOCKING:
-                    counter = self.check_count(unique_id=phone_number_hash)
+                logger.debug("Verifying user: %s" % unique_id)
 
-                logger.debug("Verifying user: %s" % phone_number_hash)
-
-                userinfos = (
-                    self.UsersInfos.select()
+                query = (
+                    self.UsersInfos.select(
+                        self.UsersInfos,
+                        self.Users.current_login,
+                        self.Users.password.alias("password_hash")
+                    )
+                    .join(self.Users, on=(self.Users.id == self.UsersInfos.userId))
                     .where(
-                        self.UsersInfos.full_phone_number == phone_number_hash,
+                        self.UsersInfos.full_phone_number.in_(data.hashes(phone_number)),
                         self.UsersInfos.status == "verified"
                     )
-                    .dicts()
                 )
 
-                # check for no user
-                if len(userinfos) < 1:
-                    if ENABLE_BLOCKING:
-                        self.add_count(counter=counter)
-                    
-                    logger.error("Invalid Phone number")
-                    raise Unauthorized()
-
-                # check for duplicate user
-                if len(userinfos) > 1:
-                    logger.error("Duplicate verified users found: %s" % phone_number_hash)
-                    raise Conflict()
+            elif user_id:
+                unique_id = user_id
 
-                logger.debug("Verifying password for user: %s" % phone_number_hash)
+                logger.debug("Verifying user: %s" % unique_id)
 
-                users = (
-                    self.Users.select()
+                query = (
+                    self.Users.select(
+                        self.Users,
+                        self.Users.password.alias("password_hash")
+                    )
+                    .join(self.UsersInfos, on=(self.UsersInfos.userId == self.Users.id))
                     .where(
-                        self.Users.id == userinfos[0]["userId"],
-                        self.Users.password == password_hash
+                        self.UsersInfos.userId == user_id,
+                        self.UsersInfos.status == "verified"
                     )
-                    .dicts()
                 )
 
-                # check for no user
-                if len(users) < 1:
-                    if ENABLE_BLOCKING:
-                        self.add_count(counter=counter)
+            else:
+                return None
+
+            # the retry record rides along so blocking needs no extra round trip,
+            # only the oldest one if concurrent failures created several
+            if ENABLE_BLOCKING:
+                FirstRetry = self.Retries.alias()
+                first_retry = (
+                    FirstRetry.select(fn.MIN(FirstRetry.id))
+                    .where(FirstRetry.uniqueId == unique_id)
+                )
 
-                    logger.error("Invalid password")
-                    raise Unauthorized()
+                query = (
+                    query.select_extend(
+                        self.Retries.id.alias("retry_id"),
+                        self.Retries.count.alias("retry_count"),
+                        self.Retries.block.alias("retry_block"),
+                        self.Retries.expires.alias("retry_expires")
+                    )
+                    .join_from(
+                        self.UsersInfos,
+                        self.Retries,
+                        JOIN.LEFT_OUTER,
+                        on=(self.Retries.id == first_retry)
+                    )
+                )
 
-                # check for duplicate user
-                if len(users) > 1:
-                    logger.error("Duplicate users found: %s" % phone_number_hash)
-                    raise Conflict()
+            users = list(query.dicts())
 
+            # check for no user
+            if len(users) < 1:
                 if ENABLE_BLOCKING:
-                    self.delete_count(counter_id=counter.id)
+                    counter = self.check_count(unique_id=unique_id)
+                    self.add_count(counter=counter)
 
-                update_login = self.Users.update(
-                    last_login = users[0]["current_login"],
-                    current_login = datetime.now()
-                ).where(
-                    self.Users.id == userinfos[0]["userId"]
-                )
+                logger.error("Invalid Phone number" if phone_number else "Invalid User ID")
+                raise Unauthorized()
 
-                update_login.execute()
+            # check for duplicate user
+            if len(users) > 1:
+                logger.error("Duplicate verified users found: %s" % unique_id)
+                raise Conflict()
 
-                logger.info("- Successfully found verified user: %s" % phone_number_hash)
-                return userinfos[0]
+            user = users[0]
+            password_hash = user.pop("password_hash")
 
-            elif user_id:
-                if ENABLE_BLOCKING:
-                    counter = self.check_count(unique_id=user_id)
+            counter = None
 
-                logger.debug("Verifying user: %s" % user_id)
+            if ENABLE_BLOCKING:
+                retry_id = user.pop("retry_id")
+                retry = {
+                    "count": user.pop("retry_count"),
+                    "block": user.pop("retry_block"),
+                    "expires": user.pop("retry_expires")
+                }
 
-                userinfos = (
-                    self.UsersInfos.select()
-                    .where(
-                        self.UsersInfos.userId == user_id,
-                        self.UsersInfos.status == "verified"
-                    )
-                    .dicts()
-                )
+                if retry_id is not None:
+                    counter = self.Retries(id=retry_id, uniqueId=unique_id, **retry)
+                    self.check_counter(counter=counter)
 
-                # check for no user
-                if len(userinfos) < 1:
-                    if ENABLE_BLOCKING:
-                        self.add_count(counter=counter)
-                    
-                    logger.error("Invalid User ID")
-                    raise Unauthorized()
+            logger.debug("Verifying password for user: %s" % unique_id)
 
-                # check for duplicate user
-                if len(userinfos) > 1:
-                    logger.error("Duplicate verified users found: %s" % user_id)
-                    raise Conflict()
+            password_match, rehash = password_hasher.verify(password=password, password_hash=password_hash)
+
+            # check for wrong password
+            if not password_match:
+                if ENABLE_BLOCKING:
+                    if counter is None:
+                        counter = self.check_count(unique_id=unique_id)
 
-                logger.debug("Verifying password for user: %s" % user_id)
+                    self.add_count(counter=counter)
 
-                users = (
-                    self.Users.select()
-                    .where(
-                        self.Users.id == userinfos[0]["userId"],
-                        self.Users.password == password_hash
+                logger.error("Invalid password")
+                raise Unauthorized()
+
+            if counter is not None:
+                self.delete_count(counter_id=counter.id)
+
+            if phone_number:
+                current_login = user.pop("current_login")
+
+                if login_buffer:
+                    login_buffer.record(user_id=user["userId"], current_login=current_login)
+                else:
+                    update_login = self.Users.update(
+                        last_login = current_login,
+                        current_login = datetime.now()
+                    ).where(
+                        self.Users.id == user["userId"]
                     )
-                    .dicts()
-                )
 
-                # check for no user
-                if len(users) < 1:
-                    if ENABLE_BLOCKING:
-                        self.add_count(counter=counter)
+                    update_login.execute()
 
-                    logger.error("Invalid password")
-                    raise Unauthorized()
+            elif login_buffer and login_buffer.get(user["id"]):
+                user.update(login_buffer.get(user["id"]))
 
-                # check for duplicate user
-                if len(users) > 1:
-                    logger.error("Duplicate users found: %s" % user_id)
-                    raise Conflict()
+            # hashes made with a retired salt or KDF are replaced once the plain values are known
+            if rehash:
+                try:
+                    self.Users.update(
+                        password=password_hasher.hash(password)
+                    ).where(
+                        self.Users.id == (user["userId"] if phone_number else user["id"])
+                    ).execute()
 
-                if ENABLE_BLOCKING:
-                    self.delete_count(counter_id=counter.id)
+                except TooManyRequests:
+                    logger.warning("Password rehash postponed: %s" % unique_id)
 
-                logger.info("- Successfully found verified user: %s" % user_id)
-                return users[0]
+            if phone_number and user["full_phone_number"] != unique_id:
+                self.rehash_phone_number(userinfo_id=user["id"], phone_number_hash=unique_id)
+                user["full_phone_number"] = unique_id
+
+            logger.info("- Successfully found verified user: %s" % unique_id)
+            return user
 
         except DatabaseError as err:
             logger.error("Failed verifying user check logs")
             raise InternalServerError(err)
 
 
+    def rehash_phone_number(self, userinfo_id: int, phone_number_hash: str) -> None:
+        """
+        Replace the phone number hash of a verified userinfo.
+
+        Arguments:
+            userinfo_id: int,
+            phone_number_hash: str
+        """
+        try:
+            self.UsersInfos.update(
+                full_phone_number=phone_number_hash,
+                verified_phone_number=phone_number_hash
+            ).where(
+                self.UsersInfos.id == userinfo_id
+            ).execute()
+
+            logger.info("- Successfully rehashed phone number: %s" % phone_number_hash)
+
+        except IntegrityError:
+            logger.error("Duplicate verified users found: %s" % phone_number_hash)
+
     def find(self, phone_number: str = None, user_id: str = None) -> UserObject:
         """
         """
@@ -258,7 +314,7 @@ class User_Model:
                 userinfos = (
                     self.UsersInfos.select()
                     .where(
-                        self.UsersInfos.full_phone_number == phone_number_hash,
+                        self.UsersInfos.full_phone_number.in_(data.hashes(phone_number)),
                         self.UsersInfos.status == "verified"
                     )
                     .dicts()
@@ -322,72 +378,74 @@ class User_Model:
                     logger.error("Duplicate verified users found: %s" % user_id)
                     raise Conflict()
 
+                last_login = user[0]["last_login"]
+
+                # logins still waiting in the buffer of this worker
+                pending_login = login_buffer.get(userinfos[0]["userId"]) if login_buffer else None
+
+                if pending_login:
+                    last_login = pending_login["last_login"]
+
                 return {
                     "userinfo": userinfos[0],
                     "createdAt": user[0]["createdAt"],
-                    "last_login": user[0]["last_login"]
+                    "last_login": last_login
                 }
 
         except DatabaseError as err:
             logger.error("Failed finding user check logs")
             raise InternalServerError(err)
 
-    def find_platform(self, user_id: str) -> UserPlatformObject:
-        """
+    def find_saved_platforms(self, user_id: str) -> list:
         """
-        try:
-            saved_platforms = []
+        Platform ids of the wallets of a user, in the order they were saved.
 
-            user_platforms = {
-                "unsaved_platforms": [],
-                "saved_platforms": []
-            }
+        Arguments:
+            user_id: str
 
+        Returns:
+            list
+        """
+        try:
             logger.debug("Fetching saved platforms for %s ..." % user_id)
 
-            saved_wallet_platform = (
-                self.Wallets.select()
-                .where(
-                    self.Wallets.userId == user_id
+            return [
+                row["platformId"] for row in (
+                    self.Wallets.select(self.Wallets.platformId)
+                    .where(
+                        self.Wallets.userId == user_id
+                    )
+                    .order_by(self.Wallets.id)
+                    .dicts()
                 )
-                .dicts()
-            )
+            ]
 
-            for row in saved_wallet_platform:
-                saved_platforms.append(row["platformId"])
+        except DatabaseError as err:
+            logger.error("Failed fetching users platforms check logs")
+            raise InternalServerError(err)
 
-                Platform = ImportPlatform(platform_name = row["platformId"])
-                platform_info = Platform.info
+    def find_platform(self, user_id: str, saved_platforms: list = None) -> UserPlatformObject:
+        """
+        """
+        try:
+            if saved_platforms is None:
+                saved_platforms = self.find_saved_platforms(user_id=user_id)
 
-                result = {
-                    "name": platform_info["name"].lower(),
-                    "description": platform_info["description"],
-                    "logo": platform_info["logo"],
-                    "initialization_url": f"/platforms/{platform_info['name']}/protocols/{platform_info['protocols'][0]}",
-                    "type": platform_info["type"],
-                    "letter": platform_info["letter"]
-                }
+            for platform in saved_platforms:
+                if platform not in catalog:
+                    logger.error("Saved platform '%s' is not available" % platform)
 
-                user_platforms["saved_platforms"].append(result)
+            saved = set(saved_platforms)
+
+            user_platforms = {
+                "unsaved_platforms": [
+                    dict(descriptor) for platform, descriptor in catalog.items() if platform not in saved
+                ],
+                "saved_platforms": [
+                    dict(catalog[platform]) for platform in saved_platforms if platform in catalog
+                ]
+            }
 
-            logger.debug("Fetching unsaved platforms for %s ..." % user_id)
-            
-            for platform in available_platforms:
-                if platform not in saved_platforms:
-                    Platform = ImportPlatform(platform_name = platform)
-                    platform_info = Platform.info
-
-                    result = {
-                        "name": platform_info["name"].lower(),
-                        "description": platform_info["description"],
-                        "logo": platform_info["logo"],
-                        "initialization_url": f"/platforms/{platform_info['name']}/protocols/{platform_info['protocols'][0]}",
-                        "type": platform_info["type"],
-                        "letter": platform_info["letter"]
-                    }
-
-                    user_platforms["unsaved_platforms"].append(result)
-        
             logger.info("- Successfully Fetched users platforms")
 
             return user_platforms
@@ -432,7 +490,8 @@ class User_Model:
 
                 upd_userinfo = (
                     self.UsersInfos.update(
-                        status = status
+                        status = status,
+                        verified_phone_number = result[0]["full_phone_number"] if status == "verified" else None
                     )
                     .where(
                         self.UsersInfos.userId == result[0]["userId"],
@@ -460,6 +519,10 @@ class User_Model:
 
                 logger.info("- User password '%s' successfully updated" % user_id)
 
+        except IntegrityError as err:
+            logger.error("Phone number of user '%s' is already verified for another account" % user_id)
+            raise Conflict()
+
         except DatabaseError as err:
             logger.error("updating user '%s' failed check logs" % user_id)
             raise InternalServerError(err)
@@ -468,38 +531,28 @@ class User_Model:
         """
         """
         try:
-            logger.debug("Finding userinfo with user_id: %s" % user_id)
-
-            userinfos = (
-                self.UsersInfos.select()
-                .where(
-                    self.UsersInfos.userId == user_id
-                )
-            )
-
-            # check for no user
-            if len(userinfos) < 1:
-                logger.error("Userinfo with user_id '%s' not found" % user_id)
-                raise Unauthorized()
-
-            # check for duplicate user
-            if len(userinfos) > 1:
-                logger.error("Duplicate users found with user_id: %s" % user_id)
-                raise Conflict()
+            logger.debug("deleting userinfo with user_id: '%s' ..." % user_id)
 
-            user = (
-                self.Users.select()
-                .where(
-                    self.Users.id == userinfos[0].userId
+            with self.db.atomic():
+                rows = (
+                    self.UsersInfos.delete()
+                    .where(
+                        self.UsersInfos.userId == user_id
+                    )
+                    .execute()
                 )
-            )
 
-            logger.info("- Successfully found user with user_id: %s" % user_id)
+                # check for no user
+                if rows < 1:
+                    logger.error("Userinfo with user_id '%s' not found" % user_id)
+                    raise Unauthorized()
 
-            logger.debug("deleting userinfo with user_id: '%s' ..." % user_id)
+                # check for duplicate user
+                if rows > 1:
+                    logger.error("Duplicate users found with user_id: %s" % user_id)
+                    raise Conflict()
 
-            userinfos[0].delete_instance()
-            user[0].delete_instance()
+                self.Users.delete().where(self.Users.id == user_id).execute()
 
             logger.info("- User account '%s' successfully deleted" % user_id)
 
@@ -560,52 +613,64 @@ class User_Model:
             return new_counter
 
         else:
-            logger.debug("Checking retry count for %s ..." % unique_id)
+            self.check_counter(counter=counter)
 
-            if not counter.expires:
-                counter_expires = 0
-                expires = counter_expires
-            else:
-                counter_expires = counter.expires
-                expires = counter_expires.timestamp()
+            logger.info("- Found retry record")
 
-            age = expires - datetime.now().timestamp()
+            return counter
 
-            if counter.count >= ATTEMPTS and age >= 0:
-                logger.error("Too many requests")
-                raise TooManyRequests()
-            elif counter.count == ATTEMPTS and age < 0:
-                logger.debug("Resetting count for %s ..." % unique_id)
+    def check_counter(self, counter) -> None:
+        """
+        Raise TooManyRequests if a retry record is blocked, resetting
+        count and block once the block has expired.
 
-                upd_counter = self.Retries.update(
-                    count = 0
-                ).where(
-                    self.Retries.uniqueId == unique_id
-                )
+        Arguments:
+            counter: Retries
+        """
+        unique_id = counter.uniqueId
 
-                upd_counter.execute()
+        logger.debug("Checking retry count for %s ..." % unique_id)
 
-                logger.info("- Successfully reset retry count")
+        if not counter.expires:
+            counter_expires = 0
+            expires = counter_expires
+        else:
+            counter_expires = counter.expires
+            expires = counter_expires.timestamp()
 
-            if counter.block >= BLOCKS and age >= 0:
-                logger.error("Too many requests")
-                raise TooManyRequests()
-            elif counter.block == BLOCKS and age < 0:
-                logger.debug("Resetting count for %s ..." % unique_id)
+        age = expires - datetime.now().timestamp()
 
-                upd_counter = self.Retries.update(
-                    block = 0
-                ).where(
-                    self.Retries.uniqueId == unique_id
-                )
+        if counter.count >= ATTEMPTS and age >= 0:
+            logger.error("Too many requests")
+            raise TooManyRequests()
+        elif counter.count == ATTEMPTS and age < 0:
+            logger.debug("Resetting count for %s ..." % unique_id)
+
+            upd_counter = self.Retries.update(
+                count = 0
+            ).where(
+                self.Retries.uniqueId == unique_id
+            )
 
-                upd_counter.execute()
+            upd_counter.execute()
 
-                logger.info("- Successfully reset retry block")
+            logger.info("- Successfully reset retry count")
 
-            logger.info("- Found retry record")
+        if counter.block >= BLOCKS and age >= 0:
+            logger.error("Too many requests")
+            raise TooManyRequests()
+        elif counter.block == BLOCKS and age < 0:
+            logger.debug("Resetting count for %s ..." % unique_id)
 
-            return counter
+            upd_counter = self.Retries.update(
+                block = 0
+            ).where(
+                self.Retries.uniqueId == unique_id
+            )
+
+            upd_counter.execute()
+
+            logger.info("- Successfully reset retry block")
 
     def add_count(self, counter) -> str:
         """
@@ -660,21 +725,13 @@ class User_Model:
     def delete_count(self, counter_id: int):
         """
         """ 
-        try:
-            logger.debug("Finding retry record %s ..." % counter_id)
+        logger.debug("deleting retry record %s ..." % counter_id)
 
-            counter = self.Retries.get(self.Retries.id == counter_id)
+        deleted = self.Retries.delete().where(self.Retries.id == counter_id).execute()
 
-        except self.Retries.DoesNotExist:
+        if deleted < 1:
             logger.error("No retry record %s found" % counter_id)
 
             raise Unauthorized()
 
-        else:
-            unique_id = counter.uniqueId
-
-            logger.debug("deleting retry record for %s ..." % unique_id)
-
-            counter.delete_instance()
-
-            logger.info("- Successfully deleted retry count")
+        logger.info("- Successfully deleted retry count")
@@ -0,0 +1,442 @@
+import logging
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from itertools import count
+
+from peewee import DatabaseError
+
+from src.schemas.db_connector import db
+from src.schemas.outbox import Outbox
+
+logger = logging.getLogger(__name__)
+
+# payload fields removed from dead-lettered jobs, which are kept indefinitely
+SECRET_FIELDS = ["token"]
+
+class PermanentJobError(Exception):
+    """
+    Raised by a job handler when retrying the job cannot succeed. The job
+    is dead-lettered at once.
+    """
+
+class OutboxStore(ABC):
+    """
+    Durable queue of jobs run after the request that enqueued them.
+
+    A job is a dict with id, kind, payload (dict) and attempts.
+
+    Methods:
+        enqueue(kind: str, payload: dict) -> None,
+        claim(limit: int, lease: float) -> list,
+        extend(job_id: int, attempts: int, lease: float) -> bool,
+        complete(job_id: int) -> None,
+        retry(job_id: int, error: str, delay: float) -> None,
+        dead(job_id: int, error: str) -> None
+    """
+
+    @abstractmethod
+    def enqueue(self, kind: str, payload: dict) -> None:
+        """
+        Add a job. With the MySQL store, the job is part of the current
+        transaction.
+
+        Arguments:
+            kind: str,
+            payload: dict
+        """
+
+    @abstractmethod
+    def claim(self, limit: int, lease: float) -> list:
+        """
+        Take up to limit due jobs and hide them from other workers for
+        lease seconds, counting an attempt.
+
+        Arguments:
+            limit: int,
+            lease: float (seconds)
+
+        Returns:
+            list
+        """
+
+    @abstractmethod
+    def extend(self, job_id: int, attempts: int, lease: float) -> bool:
+        """
+        Hide a claimed job from other workers for another lease seconds,
+        unless another worker claimed it since (its attempts changed).
+
+        Arguments:
+            job_id: int,
+            attempts: int (attempts of the job when claimed),
+            lease: float (seconds)
+
+        Returns:
+            bool (whether the job is still claimed)
+        """
+
+    @abstractmethod
+    def complete(self, job_id: int) -> None:
+        """
+        Remove a finished job.
+
+        Arguments:
+            job_id: int
+        """
+
+    @abstractmethod
+    def retry(self, job_id: int, error: str, delay: float) -> None:
+        """
+        Make a failed job due again after delay seconds.
+
+        Arguments:
+            job_id: int,
+            error: str,
+            delay: float (seconds)
+        """
+
+    @abstractmethod
+    def dead(self, job_id: int, error: str) -> None:
+        """
+        Dead-letter a job. It is kept, without its SECRET_FIELDS, but never
+        claimed again.
+
+        Arguments:
+            job_id: int,
+            error: str
+        """
+
+class MySQLOutbox(OutboxStore):
+    """
+    Jobs kept in the outbox table.
+    """
+
+    def __init__(self) -> None:
+        """
+        """
+        self.db = db
+        self.Outbox = Outbox
+
+    def enqueue(self, kind: str, payload: dict) -> None:
+        self.Outbox.create(kind=kind, payload=json.dumps(payload))
+
+    def skip_locked(self) -> bool:
+        """
+        Whether the server supports SKIP LOCKED: MySQL 8.0 and MariaDB 10.6
+        onwards. The server version is known once connected.
+
+        Returns:
+            bool
+        """
+        version = tuple(getattr(self.db, "server_version", None) or ())
+
+        return version >= (10, 6) or (8, 0) <= version < (10, 0)
+
+    def claim(self, limit: int, lease: float) -> list:
+        now = datetime.now()
+
+        with self.db.atomic():
+            query = (
+                self.Outbox.select()
+                .where(
+                    self.Outbox.status == "pending",
+                    self.Outbox.available_at <= now
+                )
+                .order_by(self.Outbox.available_at)
+                .limit(limit)
+            )
+
+            # concurrent workers skip the jobs another worker is claiming, or
+            # wait for its claim to commit where SKIP LOCKED is not supported
+            if self.db.for_update:
+                query = query.for_update("FOR UPDATE SKIP LOCKED" if self.skip_locked() else "FOR UPDATE")
+
+            jobs = list(query)
+
+            if jobs:
+                self.Outbox.update(
+                    attempts=self.Outbox.attempts + 1,
+                    available_at=now + timedelta(seconds=lease)
+                ).where(
+                    self.Outbox.id.in_([job.id for job in jobs])
+                ).execute()
+
+        return [
+            {
+                "id": job.id,
+                "kind": job.kind,
+                "payload": json.loads(job.payload),
+                "attempts": job.attempts + 1
+            } for job in jobs
+        ]
+
+    def extend(self, job_id: int, attempts: int, lease: float) -> bool:
+        return self.Outbox.update(
+            available_at=datetime.now() + timedelta(seconds=lease)
+        ).where(
+            self.Outbox.id == job_id,
+            self.Outbox.status == "pending",
+            self.Outbox.attempts == attempts
+        ).execute() > 0
+
+    def complete(self, job_id: int) -> None:
+        self.Outbox.delete().where(self.Outbox.id == job_id).execute()
+
+    def retry(self, job_id: int, error: str, delay: float) -> None:
+        self.Outbox.update(
+            last_error=error,
+            available_at=datetime.now() + timedelta(seconds=delay)
+        ).where(
+            self.Outbox.id == job_id
+        ).execute()
+
+    def dead(self, job_id: int, error: str) -> None:
+        with self.db.atomic():
+            job = self.Outbox.get_or_none(self.Outbox.id == job_id)
+
+            if job is None:
+                return
+
+            payload = {field: value for field, value in json.loads(job.payload).items() if field not in SECRET_FIELDS}
+
+            self.Outbox.update(
+                status="dead",
+                payload=json.dumps(payload),
+                last_error=error
+            ).where(
+                self.Outbox.id == job_id
+            ).execute()
+
+class MemoryOutbox(OutboxStore):
+    """
+    In-process stand-in for the outbox table, for single-worker
+    development. Jobs are lost when the process exits.
+    """
+
+    def __init__(self) -> None:
+        """
+        """
+        self.jobs = {}
+        self._ids = count(1)
+        self._lock = threading.Lock()
+
+    def enqueue(self, kind: str, payload: dict) -> None:
+        with self._lock:
+            job_id = next(self._ids)
+
+            self.jobs[job_id] = {
+                "id": job_id,
+                "kind": kind,
+                "payload": json.loads(json.dumps(payload)),
+                "status": "pending",
+                "attempts": 0,
+                "available_at": time.monotonic(),
+                "last_error": None
+            }
+
+    def claim(self, limit: int, lease: float) -> list:
+        now = time.monotonic()
+
+        with self._lock:
+            due = sorted(
+                (job for job in self.jobs.values() if job["status"] == "pending" and job["available_at"] <= now),
+                key=lambda job: job["available_at"]
+            )[:limit]
+
+            for job in due:
+                job["attempts"] += 1
+                job["available_at"] = now + lease
+
+            return [
+                {
+                    "id": job["id"],
+                    "kind": job["kind"],
+                    "payload": job["payload"],
+                    "attempts": job["attempts"]
+                } for job in due
+            ]
+
+    def extend(self, job_id: int, attempts: int, lease: float) -> bool:
+        with self._lock:
+            job = self.jobs.get(job_id)
+
+            if not job or job["status"] != "pending" or job["attempts"] != attempts:
+                return False
+
+            job["available_at"] = time.monotonic() + lease
+
+            return True
+
+    def complete(self, job_id: int) -> None:
+        with self._lock:
+            self.jobs.pop(job_id, None)
+
+    def retry(self, job_id: int, error: str, delay: float) -> None:
+        with self._lock:
+            self.jobs[job_id]["last_error"] = error
+            self.jobs[job_id]["available_at"] = time.monotonic() + delay
+
+    def dead(self, job_id: int, error: str) -> None:
+        with self._lock:
+            self.jobs[job_id]["status"] = "dead"
+            self.jobs[job_id]["last_error"] = error
+
+            for field in SECRET_FIELDS:
+                self.jobs[job_id]["payload"].pop(field, None)
+
+def create_outbox(backend: str) -> OutboxStore:
+    """
+    Build the outbox named by OUTBOX_BACKEND.
+
+    Arguments:
+        backend: str ("mysql" or "memory")
+
+    Returns:
+        OutboxStore
+    """
+    backend = backend.lower()
+
+    if backend == "mysql":
+        return MySQLOutbox()
+
+    if backend == "memory":
+        logger.warning("Using in-process outbox, queued jobs are lost when the worker exits")
+        return MemoryOutbox()
+
+    raise ValueError("Unknown outbox backend '%s'" % backend)
+
+def drain(
+    store: OutboxStore,
+    handlers: dict,
+    batch_size: int = 50,
+    max_attempts: int = 8,
+    backoff: float = 2,
+    max_backoff: float = 3600,
+    lease: float = 300
+) -> dict:
+    """
+    Run every due job once.
+
+    A failed job is retried after backoff * 2^(attempts - 1) seconds, at
+    most max_backoff, and dead-lettered after max_attempts attempts or when
+    its handler raises PermanentJobError.
+
+    The lease of a job is renewed right before it runs, so a batch may take
+    longer than the lease; a job whose lease ran out while the batch was
+    running, and that another worker claimed since, is skipped.
+
+    Arguments:
+        store: OutboxStore,
+        handlers: dict (kind: callable taking the payload),
+        batch_size: int,
+        max_attempts: int,
+        backoff: float (seconds),
+        max_backoff: float (seconds),
+        lease: float (seconds a claimed job is hidden from other workers,
+            longer than any one job runs)
+
+    Returns:
+        dict
+    """
+    result = {"completed": 0, "retried": 0, "dead": 0}
+
+    try:
+        while True:
+            jobs = store.claim(limit=batch_size, lease=lease)
+
+            if not jobs:
+                break
+
+            for job in jobs:
+                job_id = job["id"]
+
+                if not store.extend(job_id=job_id, attempts=job["attempts"], lease=lease):
+                    logger.warning("Skipping %s job %s claimed by another worker" % (job["kind"], job_id))
+                    continue
+
+                try:
+                    logger.debug("running %s job %s (attempt %d) ..." % (job["kind"], job_id, job["attempts"]))
+
+                    if job["kind"] not in handlers:
+                        raise PermanentJobError("no handler for job kind '%s'" % job["kind"])
+
+                    handlers[job["kind"]](job["payload"])
+
+                except PermanentJobError as error:
+                    logger.error("Dead-lettering %s job %s: %s" % (job["kind"], job_id, error))
+                    store.dead(job_id=job_id, error=str(error))
+                    result["dead"] += 1
+
+                except Exception as error:
+                    if job["attempts"] >= max_attempts:
+                        logger.error("Dead-lettering %s job %s after %d attempts: %s" % (job["kind"], job_id, job["attempts"], error))
+                        store.dead(job_id=job_id, error=repr(error))
+                        result["dead"] += 1
+                    else:
+                        delay = min(backoff * 2 ** (job["attempts"] - 1), max_backoff)
+
+                        logger.warning("Retrying %s job %s in %ss: %s" % (job["kind"], job_id, delay, error))
+                        store.retry(job_id=job_id, error=repr(error), delay=delay)
+                        result["retried"] += 1
+
+                else:
+                    store.complete(job_id=job_id)
+                    result["completed"] += 1
+
+            if len(jobs) < batch_size:
+                break
+
+    except DatabaseError as error:
+        logger.error("FAILED DRAINING OUTBOX CHECK LOGS")
+        raise error
+
+    finally:
+        if not db.is_closed():
+            db.close()
+
+    if any(result.values()):
+        logger.info(
+            "- Successfully drained outbox: %d completed, %d retried, %d dead" % (
+                result["completed"], result["retried"], result["dead"]
+            )
+        )
+
+    return result
+
+class OutboxWorker(threading.Thread):
+    """
+    Daemon thread running drain every interval seconds.
+
+    Methods:
+        stop() -> None
+    """
+
+    def __init__(self, store: OutboxStore, handlers: dict, interval: float = 5, **options) -> None:
+        """
+        Arguments:
+            store: OutboxStore,
+            handlers: dict,
+            interval: float (seconds),
+            options: keyword arguments of drain
+        """
+        super().__init__(name="outbox-worker", daemon=True)
+
+        self.store = store
+        self.handlers = handlers
+        self.interval = interval
+        self.options = options
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                drain(store=self.store, handlers=self.handlers, **self.options)
+            except Exception as error:
+                logger.exception(error)
+
+    def stop(self) -> None:
+        """
+        """
+        self._stopped.set()
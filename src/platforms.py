@@ -0,0 +1,51 @@
+import logging
+import json
+from hashlib import sha256
+from types import MappingProxyType
+
+from SwobThirdPartyPlatforms import ImportPlatform, available_platforms
+
+logger = logging.getLogger(__name__)
+
+def describe(platform_info: dict) -> MappingProxyType:
+    """
+    Descriptor of a platform as listed to users.
+
+    Arguments:
+        platform_info: dict
+
+    Returns:
+        MappingProxyType
+    """
+    return MappingProxyType({
+        "name": platform_info["name"].lower(),
+        "description": platform_info["description"],
+        "logo": platform_info["logo"],
+        "initialization_url": f"/platforms/{platform_info['name']}/protocols/{platform_info['protocols'][0]}",
+        "type": platform_info["type"],
+        "letter": platform_info["letter"]
+    })
+
+def build_catalog() -> MappingProxyType:
+    """
+    Read-only descriptors of every available platform, by platform id, in
+    the order of available_platforms.
+
+    Returns:
+        MappingProxyType
+    """
+    logger.debug("Building platform catalog ...")
+
+    catalog = MappingProxyType({
+        platform: describe(ImportPlatform(platform_name=platform).info) for platform in available_platforms
+    })
+
+    logger.info("- Successfully built catalog of %d platforms" % len(catalog))
+
+    return catalog
+
+catalog = build_catalog()
+
+catalog_version = sha256(
+    json.dumps({platform: dict(descriptor) for platform, descriptor in catalog.items()}, sort_keys=True).encode("utf-8")
+).hexdigest()[:16]
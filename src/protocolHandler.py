@@ -1,14 +1,20 @@
 import logging
-import asyncio
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from settings import Configurations
+TWOFACTOR_TIMEOUT = Configurations.TWOFACTOR_TIMEOUT
 
 from SwobThirdPartyPlatforms import ImportPlatform
 from SwobThirdPartyPlatforms.exceptions import PlatformDoesNotExist
 
 from werkzeug.exceptions import BadRequest
 from werkzeug.exceptions import Forbidden
+from werkzeug.exceptions import InternalServerError
 from werkzeug.exceptions import TooManyRequests
 from werkzeug.exceptions import UnprocessableEntity
 
+from src.event_loop import event_loop
+
 logger = logging.getLogger(__name__)
 
 class OAuth2:
@@ -56,7 +62,7 @@ class OAuth2:
             "grant": result
         }
 
-    def invalidation(self, token: str) -> None:
+    def invalidation(self, token: str, raise_errors: bool = False) -> None:
         """
         """
         try:
@@ -65,15 +71,21 @@ class OAuth2:
             return None
             
         except Exception as error:
+            if raise_errors:
+                raise error
+
             logger.exception(error)
 
 class TwoFactor:
 
-    def __init__(self, identifier: str, platform_name: str) -> None:
+    def __init__(self, identifier: str, platform_name: str, timeout: float = None) -> None:
         """
+        Calls to the platform that do not finish within timeout seconds
+        (TWOFACTOR_TIMEOUT by default) are cancelled.
         """
         self.identifier = identifier
         self.platform_name = platform_name
+        self.timeout = timeout or TWOFACTOR_TIMEOUT
 
         try:
             self.Platform = ImportPlatform(platform_name=self.platform_name)
@@ -81,13 +93,13 @@ class TwoFactor:
             logger.error("invalid platform name: %s" % self.platform_name)
             raise BadRequest()  
         else:       
-            self.Methods = self.Platform.methods(identifier = self.identifier)  
+            self.Methods = self.Platform.methods(identifier = self.identifier)
 
     def authorization(self) -> dict:
         """
         """
         try:
-            asyncio.run(self.Methods.authorize())
+            event_loop.run(self.Methods.authorize(), timeout=self.timeout)
 
             return {
                 "body": 201
@@ -100,12 +112,16 @@ class TwoFactor:
             
         except self.Platform.exceptions.TooManyRequests:
             raise TooManyRequests()
+
+        except FutureTimeoutError:
+            logger.error("%s timed out after %ss" % (self.platform_name, self.timeout))
+            raise InternalServerError()
     
     def validation(self, code: str, **kwargs) -> dict:
         """
         """
         try:      
-            result = asyncio.run(self.Methods.validate(code=code))
+            result = event_loop.run(self.Methods.validate(code=code), timeout=self.timeout)
 
             return {
                 "grant": result
@@ -123,11 +139,15 @@ class TwoFactor:
         except self.Platform.exceptions.TooManyRequests:
             raise TooManyRequests()
 
+        except FutureTimeoutError:
+            logger.error("%s timed out after %ss" % (self.platform_name, self.timeout))
+            raise InternalServerError()
+
     def registration(self, first_name: str, last_name: str) -> dict:
         """
         """
         try:
-            result = asyncio.run(self.Methods.register(first_name=first_name, last_name=last_name))
+            result = event_loop.run(self.Methods.register(first_name=first_name, last_name=last_name), timeout=self.timeout)
 
             return {
                 "grant": result
@@ -139,21 +159,20 @@ class TwoFactor:
         except self.Platform.exceptions.TooManyRequests:
             raise TooManyRequests()
 
-    def invalidation(self, token: str) -> None:
+        except FutureTimeoutError:
+            logger.error("%s timed out after %ss" % (self.platform_name, self.timeout))
+            raise InternalServerError()
+
+    def invalidation(self, token: str, raise_errors: bool = False) -> None:
         """
         """
         try:
-            asyncio.run(self.Methods.invalidate(token=token))
-
-            return None
-
-        except RuntimeError:
-            import nest_asyncio
-            nest_asyncio.apply()
-
-            asyncio.run(self.Methods.invalidate(token=token))
+            event_loop.run(self.Methods.invalidate(token=token), timeout=self.timeout)
 
             return None
 
         except Exception as error:
+            if raise_errors:
+                raise error
+
             logger.exception(error)
\ No newline at end of file
@@ -0,0 +1,114 @@
+import logging
+import threading
+import time
+from datetime import datetime
+
+from peewee import DatabaseError
+
+from src.schemas.db_connector import db
+from src.schemas.sessions import Sessions
+
+logger = logging.getLogger(__name__)
+
+def reap_sessions(chunk_size: int = 1000, pause: float = 0.5) -> dict:
+    """
+    Delete expired sessions in bounded batches.
+
+    Each batch looks up at most chunk_size expired sids and deletes them by
+    primary key, then sleeps for pause seconds so the reaper never holds
+    long-running locks on the sessions table.
+
+    Arguments:
+        chunk_size: int,
+        pause: float (seconds)
+
+    Returns:
+        dict
+    """
+    removed = 0
+    batches = 0
+    started = time.perf_counter()
+    now = datetime.now()
+
+    logger.debug("reaping sessions expired before %s ..." % now)
+
+    try:
+        while True:
+            batch_started = time.perf_counter()
+
+            sids = [
+                row.sid for row in (
+                    Sessions.select(Sessions.sid)
+                    .where(Sessions.expires < now)
+                    .limit(chunk_size)
+                )
+            ]
+
+            if not sids:
+                break
+
+            rows = Sessions.delete().where(Sessions.sid.in_(sids)).execute()
+
+            removed += rows
+            batches += 1
+
+            logger.info(
+                "- Removed %d expired sessions in %.3fs (batch %d)" % (rows, time.perf_counter() - batch_started, batches)
+            )
+
+            if len(sids) < chunk_size:
+                break
+
+            time.sleep(pause)
+
+    except DatabaseError as error:
+        logger.error("FAILED REAPING SESSIONS CHECK LOGS")
+        raise error
+
+    finally:
+        if not db.is_closed():
+            db.close()
+
+    elapsed = time.perf_counter() - started
+
+    logger.info("- Successfully removed %d expired sessions in %d batches (%.3fs)" % (removed, batches, elapsed))
+
+    return {
+        "removed": removed,
+        "batches": batches,
+        "seconds": elapsed
+    }
+
+class SessionReaper(threading.Thread):
+    """
+    Daemon thread running reap_sessions every interval seconds.
+
+    Methods:
+        stop() -> None
+    """
+
+    def __init__(self, interval: float, chunk_size: int = 1000, pause: float = 0.5) -> None:
+        """
+        Arguments:
+            interval: float (seconds),
+            chunk_size: int,
+            pause: float (seconds)
+        """
+        super().__init__(name="session-reaper", daemon=True)
+
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                reap_sessions(chunk_size=self.chunk_size, pause=self.pause)
+            except Exception as error:
+                logger.exception(error)
+
+    def stop(self) -> None:
+        """
+        """
+        self._stopped.set()
@@ -0,0 +1,314 @@
+import logging
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from peewee import Case
+from peewee import DatabaseError
+
+from werkzeug.exceptions import Unauthorized
+
+from src.schemas.db_connector import db
+from src.schemas.wallets import Wallets
+from src.schemas.usersinfo import UsersInfos
+
+from src.security.data import Data, data_format
+
+logger = logging.getLogger(__name__)
+
+FIELDS = [
+    (Wallets, ["username", "token", "uniqueId"]),
+    (UsersInfos, ["name", "country_code"]),
+]
+
+# hash columns recomputed from the encrypted column they are made of
+HASHES = {
+    Wallets: {"uniqueIdHash": "uniqueId"},
+}
+
+class Checkpoint:
+    """
+    Last row id re-encrypted per table, kept in a JSON file.
+
+    Chunks are re-encrypted before the checkpoint is saved, so a crash
+    replays at most one chunk; re-encryption skips values that are already
+    current, which makes the replay harmless.
+
+    The checkpoint belongs to a target (key, salt and format); a checkpoint
+    left by a run towards another target is ignored.
+
+    Methods:
+        get(table: str) -> int,
+        set(table: str, cursor: int) -> None,
+        reset() -> None
+    """
+
+    def __init__(self, path: str, target: str = None) -> None:
+        """
+        Arguments:
+            path: str,
+            target: str (optional)
+        """
+        self.path = path
+        self.target = target
+        self.cursors = {}
+
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as checkpoint_file:
+                saved = json.load(checkpoint_file)
+
+            if saved.get("target") == target:
+                self.cursors = saved.get("cursors", {})
+            else:
+                logger.warning("Ignoring checkpoint of another target '%s'" % saved.get("target"))
+
+    def get(self, table: str) -> int:
+        return self.cursors.get(table, 0)
+
+    def set(self, table: str, cursor: int) -> None:
+        self.cursors[table] = cursor
+
+        if self.path:
+            tmp_path = self.path + ".tmp"
+
+            with open(tmp_path, "w", encoding="utf-8") as checkpoint_file:
+                json.dump({"target": self.target, "cursors": self.cursors}, checkpoint_file)
+
+            os.replace(tmp_path, self.path)
+
+    def reset(self) -> None:
+        self.cursors = {}
+
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+def decrypt_value(value: str, source: Data, target: Data) -> str:
+    """
+    Decrypt a value with the source key, or with the keyring of the target
+    by the key id the value carries.
+
+    Arguments:
+        value: str,
+        source: Data,
+        target: Data
+
+    Returns:
+        str
+    """
+    if source is target:
+        return target.decrypt(value)
+
+    try:
+        return source.decrypt(value)
+    except Unauthorized:
+        return target.decrypt(value)
+
+def reencrypt_row(row: dict, fields: list, source: Data, target: Data, hashes: dict = None) -> dict:
+    """
+    New ciphertexts of the fields of a row that are not current under the
+    target key and format, and new hashes of the hash fields not made with
+    the active salt.
+
+    Arguments:
+        row: dict,
+        fields: list,
+        source: Data (key the legacy values are encrypted with),
+        target: Data,
+        hashes: dict (optional, hash field: encrypted field)
+
+    Returns:
+        dict (field: value, only the fields that changed)
+    """
+    changes = {}
+
+    for field in fields:
+        value = row[field]
+
+        if not value or target.is_current(value):
+            continue
+
+        changes[field] = target.encrypt(decrypt_value(value, source, target))
+
+    for field, plain_field in (hashes or {}).items():
+        value = row[field]
+
+        if not value or target.is_current_hash(value) or not row[plain_field]:
+            continue
+
+        changes[field] = target.hash(decrypt_value(row[plain_field], source, target))
+
+    return changes
+
+def reencrypt_table(
+    model,
+    fields: list,
+    source: Data,
+    target: Data,
+    checkpoint: Checkpoint,
+    executor: ThreadPoolExecutor,
+    chunk_size: int = 500,
+    hashes: dict = None
+) -> dict:
+    """
+    Re-encrypt the fields of a table in keyset-paginated chunks, resuming
+    from the checkpoint. Each chunk is transformed by the executor and
+    written with one UPDATE per changed field.
+
+    A value is only replaced if it has not changed since it was read, so
+    the job can run while the API is serving. Rows that cannot be
+    decrypted are logged, counted and skipped.
+
+    Arguments:
+        model: Model,
+        fields: list,
+        source: Data,
+        target: Data,
+        checkpoint: Checkpoint,
+        executor: ThreadPoolExecutor,
+        chunk_size: int,
+        hashes: dict (optional, hash field: encrypted field)
+
+    Returns:
+        dict
+    """
+    table = model._meta.table_name
+    hashes = hashes or {}
+    updated_fields = fields + list(hashes)
+    columns = [getattr(model, field) for field in updated_fields]
+
+    cursor = checkpoint.get(table)
+    total = model.select().where(model.id > cursor).count()
+
+    scanned = 0
+    updated = 0
+    failed = 0
+    started = time.perf_counter()
+
+    logger.info("- Re-encrypting %d %s rows after id %d" % (total, table, cursor))
+
+    while True:
+        rows = list(
+            model.select(model.id, *columns)
+            .where(model.id > cursor)
+            .order_by(model.id)
+            .limit(chunk_size)
+            .dicts()
+        )
+
+        if not rows:
+            break
+
+        def transform(row: dict) -> dict:
+            try:
+                return reencrypt_row(row, fields, source, target, hashes)
+            except (Unauthorized, KeyError, ValueError) as error:
+                logger.error("Failed re-encrypting %s row %s: %r" % (table, row["id"], error))
+                return None
+
+        changes = list(executor.map(transform, rows))
+        failed += sum(1 for change in changes if change is None)
+        changes = [change or {} for change in changes]
+
+        with db.atomic():
+            for field, column in zip(updated_fields, columns):
+                values = [(row["id"], row[field], change[field]) for row, change in zip(rows, changes) if field in change]
+
+                if values:
+                    model.update(
+                        {column: Case(None, [((model.id == row_id) & (column == old), new) for row_id, old, new in values], column)}
+                    ).where(
+                        model.id.in_([row_id for row_id, _, _ in values])
+                    ).execute()
+
+        cursor = rows[-1]["id"]
+        checkpoint.set(table, cursor)
+
+        scanned += len(rows)
+        updated += sum(1 for change in changes if change)
+
+        elapsed = time.perf_counter() - started
+        rate = scanned / elapsed if elapsed else 0
+        eta = (total - scanned) / rate if rate else 0
+
+        logger.info(
+            "- %s: %d/%d rows, %d updated, %d failed, %.0f rows/s, ETA %.0fs" % (
+                table, scanned, total, updated, failed, rate, max(eta, 0)
+            )
+        )
+
+        if len(rows) < chunk_size:
+            break
+
+    return {
+        "scanned": scanned,
+        "updated": updated,
+        "failed": failed,
+        "seconds": time.perf_counter() - started
+    }
+
+def reencrypt(
+    source_key: str = None,
+    checkpoint_path: str = None,
+    chunk_size: int = 500,
+    workers: int = 4,
+    reset: bool = False
+) -> dict:
+    """
+    Re-encrypt every encrypted column with the active key in the v2
+    format, and rehash the hash columns that can be recomputed with the
+    active salt.
+
+    Values in the legacy format or under another key of the keyring are
+    rotated to the active key; with source_key, values are read with that
+    key first, and with the keyring if it cannot decrypt them.
+
+    Arguments:
+        source_key: str (optional, key the data is currently encrypted with),
+        checkpoint_path: str (optional),
+        chunk_size: int,
+        workers: int,
+        reset: bool (start over instead of resuming from the checkpoint,
+            which is otherwise only kept by an interrupted run)
+
+    Returns:
+        dict (table: result)
+    """
+    target = Data()
+    source = Data(key=source_key) if source_key else target
+    checkpoint = Checkpoint(
+        path=checkpoint_path,
+        target="key %s, salt %s, %s" % (target.keyring.active_key, target.keyring.active_salt, data_format)
+    )
+
+    if reset:
+        checkpoint.reset()
+
+    results = {}
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reencrypt") as executor:
+            for model, fields in FIELDS:
+                results[model._meta.table_name] = reencrypt_table(
+                    model=model,
+                    fields=fields,
+                    source=source,
+                    target=target,
+                    checkpoint=checkpoint,
+                    executor=executor,
+                    chunk_size=chunk_size,
+                    hashes=HASHES.get(model)
+                )
+
+        # a finished run starts the next one from the beginning
+        checkpoint.reset()
+
+    except DatabaseError as error:
+        logger.error("FAILED RE-ENCRYPTING DATA CHECK LOGS")
+        raise error
+
+    finally:
+        if not db.is_closed():
+            db.close()
+
+    return results
@@ -1,45 +1,118 @@
+import time
+import threading
+
 from peewee import MySQLDatabase
 from peewee import DatabaseError
-
-from configurationHelper import DatabaseExists, CreateDatabase
+from peewee import mysql as mysql_driver
+from playhouse.pool import PooledMySQLDatabase
 
 from settings import Configurations
 db_name = Configurations.MYSQL_DATABASE
 db_host = Configurations.MYSQL_HOST
 db_password = Configurations.MYSQL_PASSWORD
 db_user = Configurations.MYSQL_USER
+db_pool = Configurations.MYSQL_POOL
+pool_max_connections = Configurations.MYSQL_POOL_MAX_CONNECTIONS
+pool_stale_timeout = Configurations.MYSQL_POOL_STALE_TIMEOUT
+pool_idle_timeout = Configurations.MYSQL_POOL_IDLE_TIMEOUT
+pool_timeout = Configurations.MYSQL_POOL_TIMEOUT
+pool_pre_ping = Configurations.MYSQL_POOL_PRE_PING
+
+# report matched rather than changed rows, so UPDATE row counts tell "not found" apart
+client_flag = mysql_driver.constants.CLIENT.FOUND_ROWS if mysql_driver else 0
+
+class PooledDatabase(PooledMySQLDatabase):
+    """
+    MySQL connection pool.
+
+    Connections are checked out on connect() and returned to the pool on close().
+    Connections older than stale_timeout or left idle in the pool for longer than
+    idle_timeout are discarded on checkout. With pre_ping, a pooled connection
+    is pinged before it is handed out so that connections dropped by the server
+    are never reused.
+    """
+
+    def __init__(self, database: str, pre_ping: bool = True, idle_timeout: int = None, **kwargs) -> None:
+        """
+        Arguments:
+            database: str,
+            pre_ping: bool (optional),
+            idle_timeout: int (optional)
+        """
+        self._pre_ping = pre_ping
+        self._idle_timeout = idle_timeout
+        self._returned_at = {}
+
+        super().__init__(database, **kwargs)
+
+    def _is_closed(self, conn) -> bool:
+        returned_at = self._returned_at.pop(self.conn_key(conn), None)
+
+        if self._idle_timeout and returned_at and time.time() - returned_at > self._idle_timeout:
+            self._close(conn, close_conn=True)
+            return True
 
-def create_database_if_not_exits(user: str, password: str, database: str, host: str) -> None:
+        if self._pre_ping:
+            return super()._is_closed(conn)
+
+        return False
+
+    def _can_reuse(self, conn) -> bool:
+        self._returned_at[self.conn_key(conn)] = time.time()
+
+        return super()._can_reuse(conn)
+
+_stats_lock = threading.Lock()
+_stats = {
+    "requests": 0,
+    "untouched": 0
+}
+
+def track_request(touched: bool) -> None:
     """
+    Count a finished request and whether it used the database.
+
+    Arguments:
+        touched: bool
+    """
+    with _stats_lock:
+        _stats["requests"] += 1
+
+        if not touched:
+            _stats["untouched"] += 1
+
+def request_stats() -> dict:
+    """
+    Number of finished requests and of those that never used the database.
+
+    Returns:
+        dict
     """
-    try:
-        if DatabaseExists(user=user, password=password, database=database, host=host):
-            pass
-        else:
-            CreateDatabase(
-                user=user,
-                password=password,
-                database=database,
-                host=host
-            )
-
-    except Exception as error:
-        raise error
+    with _stats_lock:
+        return dict(_stats)
 
 try:
-    create_database_if_not_exits(
-        database=db_name,
-        host=db_host,
-        password=db_password,
-        user=db_user
-    )
-
-    db = MySQLDatabase(
-        db_name,
-        user=db_user,
-        password=db_password,
-        host=db_host,
-    )
+    if db_pool:
+        db = PooledDatabase(
+            db_name,
+            user=db_user,
+            password=db_password,
+            host=db_host,
+            client_flag=client_flag,
+            max_connections=pool_max_connections,
+            stale_timeout=pool_stale_timeout,
+            idle_timeout=pool_idle_timeout,
+            timeout=pool_timeout,
+            pre_ping=pool_pre_ping
+        )
+    else:
+        db = MySQLDatabase(
+            db_name,
+            user=db_user,
+            password=db_password,
+            host=db_host,
+            client_flag=client_flag,
+        )
 
 except DatabaseError as error:
-    raise error
\ No newline at end of file
+    raise error
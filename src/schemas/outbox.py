@@ -0,0 +1,19 @@
+from peewee import Model, CharField, TextField, IntegerField, DateTimeField
+
+from src.schemas.db_connector import db
+
+from datetime import datetime
+
+class Outbox(Model):
+    kind = CharField()
+    payload = TextField()
+    status = CharField(default="pending")
+    attempts = IntegerField(default=0)
+    available_at = DateTimeField(default=datetime.now)
+    last_error = TextField(null=True)
+    createdAt = DateTimeField(null=True, default=datetime.now)
+
+    class Meta:
+        database = db
+        table_name = 'outbox'
+        indexes = ((('status', 'available_at'), False),)
@@ -5,7 +5,7 @@ from src.schemas.db_connector import db
 from datetime import datetime
 
 class Retries(Model):
-    uniqueId = CharField(null=True, column_name="uniqueId")
+    uniqueId = CharField(null=True, column_name="uniqueId", index=True)
     count = IntegerField(null=True)
     block = IntegerField(null=True)
     expires = DateTimeField(null=True)
@@ -13,6 +13,3 @@ class Retries(Model):
 
     class Meta:
         database = db
-
-if db.table_exists('retries') is False:
-    db.create_tables([Retries])
\ No newline at end of file
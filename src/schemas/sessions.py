@@ -10,7 +10,7 @@ class Sessions(Model):
     sid = CharField(primary_key=True, default=uuid4)
     unique_identifier = CharField(null=True)
     user_agent = CharField(null=True)
-    expires = DateTimeField(null=True)
+    expires = DateTimeField(null=True, index=True)
     data = TextField(null=True)
     status = CharField(null=True)
     type = CharField(null=True)
@@ -18,6 +18,4 @@ class Sessions(Model):
 
     class Meta:
         database = db
-
-if db.table_exists('sessions') is False:
-    db.create_tables([Sessions])
+        indexes = ((('unique_identifier', 'type'), False),)
@@ -13,6 +13,4 @@ class Svretries(Model):
 
     class Meta:
         database = db
-
-if db.table_exists('svretries') is False:
-    db.create_tables([Svretries])
\ No newline at end of file
+        indexes = ((('userId', 'uniqueId'), False),)
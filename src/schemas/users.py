@@ -14,6 +14,3 @@ class Users(Model):
 
     class Meta:
         database = db
-
-if db.table_exists('users') is False:
-    db.create_tables([Users])
\ No newline at end of file
@@ -10,6 +10,7 @@ class UsersInfos(Model):
     country_code = CharField(null=True)
     full_phone_number = CharField(null=True)
     status = CharField(default="unverified")
+    verified_phone_number = CharField(null=True, unique=True)
     userId = ForeignKeyField(Users, column_name="userId")
     iv = CharField(null=True)
     createdAt = DateTimeField(null=True, default=datetime.now)
@@ -17,6 +18,4 @@ class UsersInfos(Model):
     class Meta:
         database = db
         table_name = 'usersInfos'
-
-if db.table_exists('usersInfos') is False:
-    db.create_tables([UsersInfos])
\ No newline at end of file
+        indexes = ((('full_phone_number', 'status'), False),)
@@ -19,6 +19,3 @@ class Wallets(Model):
     class Meta:
         database = db
         indexes = ((('userId', 'platformId'), True),)
-
-if db.table_exists('wallets') is False:
-    db.create_tables([Wallets])
\ No newline at end of file
@@ -1,22 +1,21 @@
 import logging
+import hmac
+import json
+import struct
 from base64 import b64encode, b64decode
 
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import pad, unpad
-from Crypto import Random
 
-from werkzeug.exceptions import InternalServerError
 from werkzeug.exceptions import Unauthorized
 
-from settings import Configurations
+from src.security import cookie_format
+from src.security.engine import get_keyring, LEGACY_KEY_ID
 
-if Configurations.SHARED_KEY and Configurations.HASHING_SALT:
-    e_key = open(Configurations.SHARED_KEY, "r", encoding="utf-8").readline().strip()
-else:
-    from src.schemas.credentials import Credentials
+from settings import Configurations
+binary_cookies = Configurations.COOKIE_FORMAT.lower() == "binary"
 
-    creds = Credentials.get(Credentials.id == 1)
-    e_key = creds.shared_key
+KEY_ID_SEPARATOR = "."
 
 logger = logging.getLogger(__name__)
 
@@ -25,12 +24,19 @@ class Cookie:
     """
     Encrypt and decrypt cookie data.
 
+    Cookies encrypted with a key other than 1 are prefixed by its id and
+    ".", and claims signed with any key of the keyring are accepted.
+
     Attributes:
         key = str (optional)
 
     Methods:
         encrypt(data: str, iv: str = None) -> str,
-        decrypt(data: str) -> str
+        decrypt(data: str) -> str,
+        dumps(data: dict) -> str,
+        loads(data: str) -> dict,
+        sign(data: str) -> str,
+        verify(data: str, signature: str) -> bool
     """
 
     def __init__(self, key: str = None) -> None:
@@ -38,24 +44,18 @@ class Cookie:
         Arguments:
             key: str (optional)
         """
+        self.keyring = get_keyring(key=key)
+        self.engine = self.keyring.engine()
         self.key_bytes = 32
-        self.key = (
-            e_key.encode("utf8")[: self.key_bytes]
-            if not key
-            else key.encode("utf8")[: self.key_bytes]
-        )
-
-        if not len(self.key) == self.key_bytes:
-            raise InternalServerError(
-                f"Invalid encryption key length. Key >= {self.key_bytes} bytes"
-            )
+        self.key = self.engine.key
+        self.signing_key = self.engine.signing_key
 
     def encrypt(self, data: str) -> str:
         """
         Encrypt cookie data.
 
         Arguments:
-            data: str,
+            data: str | bytes,
 
         Returns:
             dict
@@ -63,13 +63,16 @@ class Cookie:
 
         logger.debug("starting cookie encryption ...")
 
-        iv = Random.new().read(AES.block_size)
+        iv = self.engine.random_bytes(AES.block_size)
 
-        cipher = AES.new(self.key, AES.MODE_CBC, iv)
-        data_bytes = data.encode()
+        cipher = self.engine.cipher(AES.MODE_CBC, iv)
+        data_bytes = data.encode() if isinstance(data, str) else data
         ct_bytes = cipher.encrypt(pad(data_bytes, AES.block_size))
         ct = b64encode(iv + ct_bytes).decode("utf-8")
 
+        if self.keyring.active_key != LEGACY_KEY_ID:
+            ct = self.keyring.active_key + KEY_ID_SEPARATOR + ct
+
         logger.info("- Successfully encryted cookie")
 
         return ct
@@ -88,10 +91,12 @@ class Cookie:
         try:
             logger.debug("starting cookie decryption ...")
 
+            key_id, _, data = data.rpartition(KEY_ID_SEPARATOR)
+
             e_cookie = b64decode(data)
             iv = e_cookie[:16]
             ct = e_cookie[16:]
-            cipher = AES.new(self.key, AES.MODE_CBC, iv)
+            cipher = self.keyring.engine(key_id or LEGACY_KEY_ID).cipher(AES.MODE_CBC, iv)
             pt = unpad(cipher.decrypt(ct), AES.block_size)
 
             logger.info("- Successfully decryted cookie")
@@ -101,3 +106,75 @@ class Cookie:
         except (ValueError, KeyError) as error:
             logger.error(error)
             raise Unauthorized() from error
+
+    def dumps(self, data: dict) -> str:
+        """
+        Serialize and encrypt a cookie payload.
+
+        The compact binary format is used when COOKIE_FORMAT is "binary" and
+        the payload can be encoded exactly, JSON otherwise.
+
+        Arguments:
+            data: dict
+
+        Returns:
+            str
+        """
+        payload = cookie_format.encode(data) if binary_cookies else None
+
+        if payload is None:
+            payload = json.dumps(data).encode()
+
+        return self.encrypt(payload)
+
+    def loads(self, data: str) -> dict:
+        """
+        Decrypt and deserialize a cookie payload in either format.
+
+        Arguments:
+            data: str
+
+        Returns:
+            dict
+        """
+        pt = self.decrypt(data)
+
+        try:
+            if pt[:1] == cookie_format.VERSION:
+                return cookie_format.decode(pt)
+
+            return json.loads(pt)
+
+        except (ValueError, KeyError, IndexError, struct.error) as error:
+            logger.error(error)
+            raise Unauthorized() from error
+
+    def sign(self, data: str) -> str:
+        """
+        Sign cookie claims.
+
+        Arguments:
+            data: str
+
+        Returns:
+            str
+        """
+        return self.engine.sign(data.encode("utf-8"))
+
+    def verify(self, data: str, signature: str) -> bool:
+        """
+        Verify the signature of cookie claims.
+
+        Arguments:
+            data: str,
+            signature: str
+
+        Returns:
+            bool
+        """
+        data_bytes = data.encode("utf-8")
+
+        return any(
+            hmac.compare_digest(self.keyring.engine(key_id).sign(data_bytes), signature or "")
+            for key_id in self.keyring.keys
+        )
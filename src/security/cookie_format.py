@@ -0,0 +1,199 @@
+"""Compact binary cookie payload format
+
+A payload is a version byte followed by tagged fields. Each field is a tag
+byte and a value encoded according to the field's kind; a tag with the high
+bit set stands for a null value. The session data ("cookie") is stored as
+integers and rebuilt into the exact JSON string kept in the sessions table.
+
+Payloads that cannot be rebuilt exactly are not encoded (encode returns
+None) and the caller falls back to JSON.
+"""
+
+import json
+import struct
+from datetime import datetime, timedelta
+from uuid import UUID
+
+VERSION = b"\x01"
+
+NULL = 0x80
+
+EPOCH = datetime(1970, 1, 1)
+
+FIELDS = {
+    "sid": (1, "uuid"),
+    "cookie": (2, "session"),
+    "type": (3, "str"),
+    "status": (4, "str"),
+    "uid": (5, "str"),
+    "unique_identifier": (6, "str"),
+    "phone_number": (7, "str"),
+    "cid": (8, "int"),
+    "exp": (9, "int"),
+    "ver": (10, "int"),
+    "sig": (11, "hex"),
+}
+
+TAGS = {tag: (key, kind) for key, (tag, kind) in FIELDS.items()}
+
+SAME_SITE = ["lax", "strict", "none"]
+
+def _session_data(expires: datetime, max_age: int, secure: bool, http_only: bool, same_site: str) -> str:
+    return json.dumps({
+        "maxAge": max_age,
+        "expires": str(expires),
+        "secure": secure,
+        "httpOnly": http_only,
+        "sameSite": same_site,
+    })
+
+def _encode_str(value: str) -> bytes:
+    value_bytes = value.encode("utf-8")
+    return struct.pack(">H", len(value_bytes)) + value_bytes
+
+def _encode_value(kind: str, value) -> bytes:
+    if kind == "str":
+        if not isinstance(value, str):
+            return None
+        return _encode_str(value)
+
+    if kind == "int":
+        if type(value) is not int:
+            return None
+        return struct.pack(">q", value)
+
+    if kind == "uuid":
+        if not isinstance(value, str) or str(UUID(value)) != value:
+            return None
+        return UUID(value).bytes
+
+    if kind == "hex":
+        value_bytes = bytes.fromhex(value)
+        if value_bytes.hex() != value or len(value_bytes) > 255:
+            return None
+        return struct.pack(">B", len(value_bytes)) + value_bytes
+
+    if kind == "session":
+        data = json.loads(value)
+
+        if set(data) != {"maxAge", "expires", "secure", "httpOnly", "sameSite"}:
+            return None
+        if type(data["maxAge"]) is not int or data["sameSite"] not in SAME_SITE:
+            return None
+
+        expires = datetime.fromisoformat(data["expires"])
+        flags = (1 if data["secure"] is True else 0) | (2 if data["httpOnly"] is True else 0)
+
+        if _session_data(expires, data["maxAge"], flags & 1 == 1, flags & 2 == 2, data["sameSite"]) != value:
+            return None
+
+        return struct.pack(
+            ">qIBB",
+            (expires - EPOCH) // timedelta(microseconds=1),
+            data["maxAge"],
+            flags,
+            SAME_SITE.index(data["sameSite"])
+        )
+
+    return None
+
+def encode(payload: dict) -> bytes:
+    """
+    Encode a cookie payload.
+
+    Arguments:
+        payload: dict
+
+    Returns:
+        bytes, or None if the payload cannot be encoded exactly
+    """
+    result = [VERSION]
+
+    try:
+        for key, value in payload.items():
+            if key not in FIELDS:
+                return None
+
+            tag, kind = FIELDS[key]
+
+            if value is None:
+                result.append(struct.pack(">B", tag | NULL))
+                continue
+
+            encoded = _encode_value(kind, value)
+
+            if encoded is None:
+                return None
+
+            result.append(struct.pack(">B", tag) + encoded)
+
+    except (ValueError, TypeError, OverflowError, struct.error):
+        return None
+
+    return b"".join(result)
+
+def decode(data: bytes) -> dict:
+    """
+    Decode a cookie payload.
+
+    Arguments:
+        data: bytes
+
+    Returns:
+        dict
+
+    Raises:
+        ValueError, struct.error
+    """
+    if data[:1] != VERSION:
+        raise ValueError("Unknown cookie format")
+
+    payload = {}
+    offset = 1
+
+    while offset < len(data):
+        (tag,) = struct.unpack_from(">B", data, offset)
+        offset += 1
+
+        key, kind = TAGS[tag & ~NULL]
+
+        if tag & NULL:
+            payload[key] = None
+            continue
+
+        if kind == "str":
+            (length,) = struct.unpack_from(">H", data, offset)
+            offset += 2
+            payload[key] = data[offset:offset + length].decode("utf-8")
+            offset += length
+
+        elif kind == "int":
+            (payload[key],) = struct.unpack_from(">q", data, offset)
+            offset += 8
+
+        elif kind == "uuid":
+            payload[key] = str(UUID(bytes=data[offset:offset + 16]))
+            offset += 16
+
+        elif kind == "hex":
+            (length,) = struct.unpack_from(">B", data, offset)
+            offset += 1
+            payload[key] = data[offset:offset + length].hex()
+            offset += length
+
+        elif kind == "session":
+            expires_us, max_age, flags, same_site = struct.unpack_from(">qIBB", data, offset)
+            offset += struct.calcsize(">qIBB")
+
+            payload[key] = _session_data(
+                EPOCH + timedelta(microseconds=expires_us),
+                max_age,
+                flags & 1 == 1,
+                flags & 2 == 2,
+                SAME_SITE[same_site]
+            )
+
+    if offset != len(data):
+        raise ValueError("Truncated cookie")
+
+    return payload
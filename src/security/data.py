@@ -2,25 +2,24 @@ import hashlib
 import hmac
 import re
 import logging
+import binascii
+from base64 import b64encode, b64decode
 
 from Crypto.Cipher import AES
-from Crypto.Util.Padding import pad
-from Crypto import Random
+from Crypto.Util.Padding import pad, unpad
 
-from werkzeug.exceptions import InternalServerError
 from werkzeug.exceptions import Unauthorized
 
-from settings import Configurations
+from src.security.engine import get_keyring, LEGACY_KEY_ID
 
-if Configurations.SHARED_KEY and Configurations.HASHING_SALT:
-    e_key = open(Configurations.SHARED_KEY, "r", encoding="utf-8").readline().strip()
-    h_salt = open(Configurations.HASHING_SALT, "r", encoding="utf-8").readline().strip()
-else:
-    from src.schemas.credentials import Credentials
+from settings import Configurations
+data_format = Configurations.DATA_FORMAT.lower()
 
-    creds = Credentials.get(Credentials.id == 1)
-    e_key = creds.shared_key
-    h_salt = creds.hashing_salt
+V2_PREFIX = "v2:"
+KEY_ID_SEPARATOR = ":"
+HASH_ID_SEPARATOR = "$"
+NONCE_BYTES = 12
+TAG_BYTES = 16
 
 logger = logging.getLogger(__name__)
 
@@ -29,13 +28,19 @@ class Data:
     """
     Encrypt, decrypt and hash data.
 
+    Values written with a key or salt other than 1 carry its id; they are
+    read back with the keyring entry of that id.
+
     Attributes:
-        key: str (optional)
+        key: str (optional, use only this key instead of the keyring)
 
     Methods:
         encrypt(data: str, iv: str = None) -> dict,
         decrypt(data: str, iv: str) -> str,
-        hash(data: str, salt: str = None) -> str
+        is_current(data: str) -> bool,
+        hash(data: str, salt: str = None) -> str,
+        hashes(data: str) -> list,
+        is_current_hash(data: str) -> bool
     """
 
     def __init__(self, key: str = None) -> None:
@@ -43,23 +48,22 @@ class Data:
         Arguments:
             key: str (optional)
         """
+        self.keyring = get_keyring(key=key)
+        self.engine = self.keyring.engine()
         self.key_bytes = 32
-        self.key = (
-            e_key.encode("utf8")[: self.key_bytes]
-            if not key
-            else key.encode("utf8")[: self.key_bytes]
-        )
-        self.salt = h_salt.encode("utf-8")
-
-        if not len(self.key) == self.key_bytes:
-            raise InternalServerError(
-                f"Invalid encryption key length. Key >= {self.key_bytes} bytes"
-            )
+        self.key = self.engine.key
+        self.salt = self.engine.salt
 
     def encrypt(self, data: str) -> dict:
         """
         Encrypt data.
 
+        With DATA_FORMAT "v2" (default) the result is "v2:", the active key
+        id and ":" unless the active key is 1, then the base64 of a 12-byte
+        nonce, the AES-GCM ciphertext and its 16-byte tag. With "v1" it is
+        the legacy AES-CBC format under key 1, a 16-character IV followed by
+        the hex ciphertext.
+
         Arguments:
             data: str,
 
@@ -68,27 +72,65 @@ class Data:
         """
         logger.debug("starting data encryption ...")
 
-        iv = Random.new().read(AES.block_size).hex()[:16].encode("utf-8")
-
         if not data:
             logger.info("- Nothing to encrypt")
             return None
 
         data_bytes = data.encode("utf-8")
-        cipher = AES.new(self.key, AES.MODE_CBC, iv)
-        ct_bytes = cipher.encrypt(pad(data_bytes, 16))
-        ct_iv = cipher.iv.decode("utf-8")
-        ct = ct_bytes.hex()
 
-        result = ct_iv + ct
+        if data_format == "v2":
+            nonce = self.engine.random_bytes(NONCE_BYTES)
+            cipher = self.engine.cipher(AES.MODE_GCM, nonce)
+            ct_bytes, tag = cipher.encrypt_and_digest(data_bytes)
+
+            key_id = self.keyring.active_key
+            prefix = V2_PREFIX if key_id == LEGACY_KEY_ID else V2_PREFIX + key_id + KEY_ID_SEPARATOR
+
+            result = prefix + b64encode(nonce + ct_bytes + tag).decode("ascii")
+
+        else:
+            # the legacy format has no room for a key id
+            engine = self.keyring.engine(LEGACY_KEY_ID)
+            iv = engine.random_bytes(AES.block_size).hex()[:16].encode("utf-8")
+            cipher = engine.cipher(AES.MODE_CBC, iv)
+            ct_bytes = cipher.encrypt(pad(data_bytes, 16))
+            ct_iv = cipher.iv.decode("utf-8")
+            ct = ct_bytes.hex()
+
+            result = ct_iv + ct
 
         logger.info("- Successfully encryted data")
 
         return result
 
+    def _key_id(self, data: str) -> str:
+        body = data[len(V2_PREFIX):]
+
+        if KEY_ID_SEPARATOR in body:
+            return body.split(KEY_ID_SEPARATOR, 1)[0]
+
+        return LEGACY_KEY_ID
+
+    def _decrypt_v2(self, data: str) -> bytes:
+        key_id = self._key_id(data)
+        body = data[len(V2_PREFIX):].split(KEY_ID_SEPARATOR)[-1]
+
+        raw = b64decode(body, validate=True)
+
+        if len(raw) < NONCE_BYTES + TAG_BYTES:
+            raise ValueError("Truncated ciphertext")
+
+        nonce = raw[:NONCE_BYTES]
+        ct_bytes = raw[NONCE_BYTES:-TAG_BYTES]
+        tag = raw[-TAG_BYTES:]
+
+        cipher = self.keyring.engine(key_id).cipher(AES.MODE_GCM, nonce)
+
+        return cipher.decrypt_and_verify(ct_bytes, tag)
+
     def decrypt(self, data: str) -> str:
         """
-        Decrypt data.
+        Decrypt data in either format.
 
         Arguments:
             data: str,
@@ -103,27 +145,63 @@ class Data:
                 logger.info("- Nothing to decrypt")
                 return None
 
+            if data.startswith(V2_PREFIX):
+                return self._decrypt_v2(data).decode("utf-8")
+
             iv = data[:16]
             e_data = data[16:]
 
             str_data = bytes.fromhex(e_data)
             iv_bytes = iv.encode("utf8")
-            cipher = AES.new(self.key, AES.MODE_CBC, iv_bytes)
-            ciphertext = cipher.decrypt(str_data).decode("utf-8")
-            cleared_text = re.sub(
-                r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\xff]", "", ciphertext
-            )
+            cipher = self.keyring.engine(LEGACY_KEY_ID).cipher(AES.MODE_CBC, iv_bytes)
+            plaintext = cipher.decrypt(str_data)
+
+            try:
+                return unpad(plaintext, AES.block_size).decode("utf-8")
+            except ValueError:
+                # not PKCS#7 padded, clean the padding up as before
+                ciphertext = plaintext.decode("utf-8")
+                cleared_text = re.sub(
+                    r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\xff]", "", ciphertext
+                )
 
-            return cleared_text
+                return cleared_text
 
-        except (ValueError, KeyError) as error:
+        except (ValueError, KeyError, binascii.Error) as error:
             logger.exception(error)
             raise Unauthorized() from error
 
+    def is_current(self, data: str) -> bool:
+        """
+        Whether data is in the v2 format and authenticates under the active
+        key.
+
+        Arguments:
+            data: str
+
+        Returns:
+            bool
+        """
+        if not data or not data.startswith(V2_PREFIX):
+            return False
+
+        if self._key_id(data) != self.keyring.active_key:
+            return False
+
+        try:
+            self._decrypt_v2(data)
+            return True
+
+        except (ValueError, binascii.Error):
+            return False
+
     def hash(self, data: str, salt: str = None) -> str:
         """
         Hash data.
 
+        Without salt, data is hashed with the active salt, prefixed by its
+        id and "$" unless the active salt is 1.
+
         Arguments:
             data: str,
             salt: str (optional)
@@ -133,11 +211,55 @@ class Data:
         """
         logger.debug("starting data hashing ...")
 
-        hash_data = hmac.new(
-            self.salt if not salt else salt.encode("utf-8"),
-            data.encode("utf-8"),
-            hashlib.sha512,
-        )
+        if salt:
+            hash_data = hmac.new(salt.encode("utf-8"), data.encode("utf-8"), hashlib.sha512).hexdigest()
+        else:
+            hash_data = self._hash(data, self.keyring.active_salt)
+
         logger.info("- Successfully hashed data")
 
-        return str(hash_data.hexdigest())
+        return hash_data
+
+    def _hash(self, data: str, salt_id: str) -> str:
+        hash_data = self.keyring.hasher(salt_id).hash(data.encode("utf-8"))
+
+        if salt_id == LEGACY_KEY_ID:
+            return hash_data
+
+        return salt_id + HASH_ID_SEPARATOR + hash_data
+
+    def hashes(self, data: str) -> list:
+        """
+        Hashes of data under every salt, the active one first, to look up
+        values stored before a salt rotation.
+
+        Arguments:
+            data: str
+
+        Returns:
+            list
+        """
+        salt_ids = [self.keyring.active_salt]
+        salt_ids += [salt_id for salt_id in self.keyring.salts if salt_id != self.keyring.active_salt]
+
+        return [self._hash(data, salt_id) for salt_id in salt_ids]
+
+    def is_current_hash(self, data: str) -> bool:
+        """
+        Whether a hash was made with the active salt.
+
+        Arguments:
+            data: str
+
+        Returns:
+            bool
+        """
+        if not data:
+            return False
+
+        if HASH_ID_SEPARATOR in data:
+            salt_id = data.split(HASH_ID_SEPARATOR, 1)[0]
+        else:
+            salt_id = LEGACY_KEY_ID
+
+        return salt_id == self.keyring.active_salt
@@ -0,0 +1,249 @@
+import hashlib
+import hmac
+import logging
+from functools import lru_cache
+
+from Crypto.Cipher import AES
+from Crypto import Random
+
+from werkzeug.exceptions import InternalServerError
+
+from settings import Configurations
+
+def read_keys(path: str) -> dict:
+    """
+    Keys of a key file, one per line, numbered from 1.
+
+    Arguments:
+        path: str
+
+    Returns:
+        dict (key id: key)
+    """
+    with open(path, "r", encoding="utf-8") as key_file:
+        keys = [line.strip() for line in key_file]
+
+    return {str(key_id): key for key_id, key in enumerate(keys, start=1) if key}
+
+if Configurations.SHARED_KEY and Configurations.HASHING_SALT:
+    e_keys = read_keys(Configurations.SHARED_KEY)
+    h_salts = read_keys(Configurations.HASHING_SALT)
+else:
+    from src.schemas.credentials import Credentials
+
+    creds = list(Credentials.select().order_by(Credentials.id))
+    e_keys = {str(cred.id): cred.shared_key for cred in creds}
+    h_salts = {str(cred.id): cred.hashing_salt for cred in creds}
+
+active_key_id = str(Configurations.ACTIVE_KEY or min(e_keys, key=int))
+active_salt_id = str(Configurations.ACTIVE_SALT or min(h_salts, key=int))
+
+e_key = e_keys[active_key_id]
+h_salt = h_salts[active_salt_id]
+
+logger = logging.getLogger(__name__)
+
+KEY_BYTES = 32
+LEGACY_KEY_ID = "1"
+
+class CryptoEngine:
+    """
+    Key material prepared once and shared by every Data and Cookie of a
+    worker.
+
+    The keyed HMAC states are initialised once and copied per call; they
+    are never updated themselves, so copying them from several threads is
+    safe. The random source is a single reusable handle on the OS CSPRNG.
+
+    Attributes:
+        key: bytes (AES key),
+        salt: bytes (HMAC-SHA512 key),
+        signing_key: bytes (HMAC-SHA256 key for cookie claims)
+
+    Methods:
+        random_bytes(size: int) -> bytes,
+        cipher(mode: int, iv: bytes) -> object,
+        hash(data: bytes) -> str,
+        sign(data: bytes) -> str
+    """
+
+    def __init__(self, key: str, salt: str) -> None:
+        """
+        Arguments:
+            key: str,
+            salt: str
+        """
+        self.key = key.encode("utf8")[:KEY_BYTES]
+
+        if not len(self.key) == KEY_BYTES:
+            raise InternalServerError(
+                f"Invalid encryption key length. Key >= {KEY_BYTES} bytes"
+            )
+
+        self.salt = salt.encode("utf-8")
+        self.signing_key = hashlib.sha256(b"cookie-signing:" + self.key).digest()
+
+        self._hash = hmac.new(self.salt, digestmod=hashlib.sha512)
+        self._sign = hmac.new(self.signing_key, digestmod=hashlib.sha256)
+        self._random = Random.new()
+
+    def random_bytes(self, size: int) -> bytes:
+        """
+        Arguments:
+            size: int
+
+        Returns:
+            bytes
+        """
+        return self._random.read(size)
+
+    def cipher(self, mode: int, iv: bytes):
+        """
+        New AES cipher under the engine key.
+
+        Arguments:
+            mode: int (AES.MODE_*),
+            iv: bytes
+
+        Returns:
+            object
+        """
+        return AES.new(self.key, mode, iv)
+
+    def hash(self, data: bytes) -> str:
+        """
+        HMAC-SHA512 of data under the salt, hex encoded.
+
+        Arguments:
+            data: bytes
+
+        Returns:
+            str
+        """
+        hash_data = self._hash.copy()
+        hash_data.update(data)
+
+        return hash_data.hexdigest()
+
+    def sign(self, data: bytes) -> str:
+        """
+        HMAC-SHA256 of data under the signing key, hex encoded.
+
+        Arguments:
+            data: bytes
+
+        Returns:
+            str
+        """
+        signature = self._sign.copy()
+        signature.update(data)
+
+        return signature.hexdigest()
+
+@lru_cache(maxsize=8)
+def get_engine(key: str = None, salt: str = None) -> CryptoEngine:
+    """
+    Shared engine for a key and salt, the configured ones by default.
+
+    Arguments:
+        key: str (optional),
+        salt: str (optional)
+
+    Returns:
+        CryptoEngine
+    """
+    return CryptoEngine(key=key or e_key, salt=salt or h_salt)
+
+class Keyring:
+    """
+    Every shared key and hashing salt, by id.
+
+    New data is encrypted with the active key and hashed with the active
+    salt; existing data is read with the key or salt its id names. Data
+    without an id belongs to key and salt 1.
+
+    Attributes:
+        keys: dict (key id: key),
+        salts: dict (salt id: salt),
+        active_key: str (key id),
+        active_salt: str (salt id)
+
+    Methods:
+        engine(key_id: str = None) -> CryptoEngine,
+        hasher(salt_id: str = None) -> CryptoEngine
+    """
+
+    def __init__(self, keys: dict, salts: dict, active_key: str, active_salt: str) -> None:
+        """
+        Arguments:
+            keys: dict,
+            salts: dict,
+            active_key: str,
+            active_salt: str
+        """
+        if active_key not in keys or active_salt not in salts:
+            raise InternalServerError(
+                "Unknown active key '%s' or salt '%s'" % (active_key, active_salt)
+            )
+
+        self.keys = keys
+        self.salts = salts
+        self.active_key = active_key
+        self.active_salt = active_salt
+
+    def engine(self, key_id: str = None) -> CryptoEngine:
+        """
+        Engine encrypting with a key, the active one by default.
+
+        Arguments:
+            key_id: str (optional)
+
+        Returns:
+            CryptoEngine
+        """
+        return get_engine(
+            key=self.keys[key_id or self.active_key],
+            salt=self.salts[self.active_salt]
+        )
+
+    def hasher(self, salt_id: str = None) -> CryptoEngine:
+        """
+        Engine hashing with a salt, the active one by default.
+
+        Arguments:
+            salt_id: str (optional)
+
+        Returns:
+            CryptoEngine
+        """
+        return get_engine(
+            key=self.keys[self.active_key],
+            salt=self.salts[salt_id or self.active_salt]
+        )
+
+keyring = Keyring(
+    keys=e_keys,
+    salts=h_salts,
+    active_key=active_key_id,
+    active_salt=active_salt_id
+)
+
+def get_keyring(key: str = None) -> Keyring:
+    """
+    The configured keyring, or a keyring holding only key as key 1.
+
+    Arguments:
+        key: str (optional)
+
+    Returns:
+        Keyring
+    """
+    if not key:
+        return keyring
+
+    return Keyring(
+        keys={LEGACY_KEY_ID: key},
+        salts=keyring.salts,
+        active_key=LEGACY_KEY_ID,
+        active_salt=keyring.active_salt
+    )
@@ -0,0 +1,175 @@
+import hashlib
+import hmac
+import logging
+import threading
+from base64 import b64encode, b64decode
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import TooManyRequests
+
+from src.security.data import Data
+from src.security.engine import get_engine
+
+from settings import Configurations
+PASSWORD_KDF = Configurations.PASSWORD_KDF.lower()
+SCRYPT_N = Configurations.SCRYPT_N
+SCRYPT_R = Configurations.SCRYPT_R
+SCRYPT_P = Configurations.SCRYPT_P
+PASSWORD_WORKERS = Configurations.PASSWORD_WORKERS
+PASSWORD_QUEUE_SIZE = Configurations.PASSWORD_QUEUE_SIZE
+
+SCRYPT_PREFIX = "scrypt"
+SEPARATOR = "$"
+SALT_BYTES = 16
+KEY_BYTES = 64
+
+logger = logging.getLogger(__name__)
+
+class PasswordHasher:
+    """
+    Hash and verify passwords with scrypt.
+
+    The key derivations run on a pool of worker threads, so at most
+    workers of them use the CPU at once; a request arriving when
+    queue_size derivations are already running or waiting is turned away
+    with TooManyRequests instead of queueing behind a login storm.
+
+    Hashes are stored as "scrypt$n$r$p$salt$key", salt and key in base64.
+    Legacy HMAC-SHA512 hashes are still verified, and reported for
+    rehashing.
+
+    Attributes:
+        kdf: str ("scrypt" or "hmac"),
+        n: int,
+        r: int,
+        p: int,
+        workers: int,
+        queue_size: int
+
+    Methods:
+        hash(password: str) -> str,
+        verify(password: str, password_hash: str) -> tuple,
+        stop() -> None
+    """
+
+    def __init__(self, kdf: str = "scrypt", n: int = 16384, r: int = 8, p: int = 1, workers: int = 4, queue_size: int = 64) -> None:
+        """
+        Arguments:
+            kdf: str ("scrypt", or "hmac" to keep writing legacy hashes),
+            n: int (CPU/memory cost, a power of 2),
+            r: int (block size),
+            p: int (parallelization),
+            workers: int,
+            queue_size: int
+        """
+        if kdf not in ("scrypt", "hmac"):
+            raise ValueError("Unknown password KDF '%s'" % kdf)
+
+        self.kdf = kdf
+        self.n = n
+        self.r = r
+        self.p = p
+        self.workers = workers
+        self.queue_size = queue_size
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password")
+
+    def _derive(self, password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+        if not self._slots.acquire(blocking=False):
+            logger.error("Password queue full (%d)" % self.queue_size)
+            raise TooManyRequests()
+
+        try:
+            future = self._executor.submit(
+                hashlib.scrypt,
+                password.encode("utf-8"),
+                salt=salt,
+                n=n,
+                r=r,
+                p=p,
+                maxmem=128 * r * (n + p + 2) + 1024 * 1024,
+                dklen=KEY_BYTES
+            )
+
+            return future.result()
+
+        finally:
+            self._slots.release()
+
+    def hash(self, password: str) -> str:
+        """
+        Hash a password with the configured KDF and cost.
+
+        Arguments:
+            password: str
+
+        Returns:
+            str
+        """
+        if self.kdf == "hmac":
+            return Data().hash(password)
+
+        salt = get_engine().random_bytes(SALT_BYTES)
+        key = self._derive(password, salt, self.n, self.r, self.p)
+
+        return SEPARATOR.join([
+            SCRYPT_PREFIX,
+            str(self.n),
+            str(self.r),
+            str(self.p),
+            b64encode(salt).decode("ascii"),
+            b64encode(key).decode("ascii")
+        ])
+
+    def verify(self, password: str, password_hash: str) -> tuple:
+        """
+        Check a password against its hash.
+
+        Arguments:
+            password: str,
+            password_hash: str
+
+        Returns:
+            tuple (match: bool, rehash: bool, whether the hash should be
+            replaced with a new hash of the password)
+        """
+        if not password_hash:
+            return False, False
+
+        if not password_hash.startswith(SCRYPT_PREFIX + SEPARATOR):
+            data = Data()
+
+            match = any(
+                hmac.compare_digest(candidate, password_hash)
+                for candidate in data.hashes(password)
+            )
+
+            return match, match and (self.kdf == "scrypt" or not data.is_current_hash(password_hash))
+
+        try:
+            _, n, r, p, salt, key = password_hash.split(SEPARATOR)
+            n, r, p = int(n), int(r), int(p)
+            salt, key = b64decode(salt), b64decode(key)
+
+        except ValueError:
+            logger.error("Malformed password hash")
+            return False, False
+
+        match = hmac.compare_digest(self._derive(password, salt, n, r, p), key)
+
+        return match, match and self.kdf == "scrypt" and (n, r, p) != (self.n, self.r, self.p)
+
+    def stop(self) -> None:
+        """
+        Stop the workers once the pending derivations are done.
+        """
+        self._executor.shutdown(wait=True)
+
+password_hasher = PasswordHasher(
+    kdf=PASSWORD_KDF,
+    n=SCRYPT_N,
+    r=SCRYPT_R,
+    p=SCRYPT_P,
+    workers=PASSWORD_WORKERS,
+    queue_size=PASSWORD_QUEUE_SIZE
+)